@@ -0,0 +1,16 @@
+"""
+API权限模块
+"""
+from rest_framework.permissions import BasePermission
+
+
+class CanRetrieveHostPasswords(BasePermission):
+    """已登录且拥有 host_management.retrieve_password 权限的用户（超级用户默认拥有）"""
+    message = '没有获取主机密码的权限'
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(
+            user and user.is_authenticated
+            and user.has_perm('host_management.retrieve_password')
+        )
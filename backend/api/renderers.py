@@ -0,0 +1,41 @@
+"""
+API渲染器模块 - 流式输出格式
+"""
+import json
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    """NDJSON渲染器（每行一个JSON对象，编码规则与 JSONRenderer 相同）"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    @staticmethod
+    def render_item(item):
+        return json.dumps(item, ensure_ascii=False, cls=JSONEncoder) + '\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return self.render_item(data).encode(self.charset)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Server-Sent Events渲染器"""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    @staticmethod
+    def render_item(item, event=None):
+        data = json.dumps(item, ensure_ascii=False, cls=JSONEncoder)
+        if event:
+            return f'event: {event}\ndata: {data}\n\n'
+        return f'data: {data}\n\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return self.render_item(data, event='error').encode(self.charset)
@@ -5,7 +5,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     CityViewSet, DataCenterViewSet, HostViewSet,
-    HostPasswordViewSet, HostStatisticsViewSet
+    HostPasswordViewSet, HostStatisticsViewSet, RequestLatencyViewSet
 )
 
 router = DefaultRouter()
@@ -14,6 +14,7 @@ router.register(r'data-centers', DataCenterViewSet, basename='datacenter')
 router.register(r'hosts', HostViewSet, basename='host')
 router.register(r'host-passwords', HostPasswordViewSet, basename='hostpassword')
 router.register(r'statistics', HostStatisticsViewSet, basename='statistics')
+router.register(r'request-latency', RequestLatencyViewSet, basename='requestlatency')
 
 urlpatterns = [
     path('api/', include(router.urls)),
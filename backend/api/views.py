@@ -1,16 +1,38 @@
 """
 API视图模块
 """
+import hashlib
+import time
+from datetime import timedelta
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from host_management.models import City, DataCenter, Host, HostPassword, HostStatistics
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags
+from host_management.models import (
+    City, DataCenter, Host, HostCounter, HostPassword, HostPasswordHistory, HostStatistics, RequestLatencyRollup,
+    RequestLog
+)
 from host_management.serializers import (
     CitySerializer, DataCenterSerializer, HostSerializer,
-    HostPasswordSerializer, HostStatisticsSerializer
+    HostPasswordSerializer, HostStatisticsSerializer, HostCounterSerializer
+)
+from host_management.passwords import iter_decrypted_passwords, record_password_access
+from host_management.reachability import cached_ping_host, iter_cached_ping_hosts, get_cache_stats
+from host_management.request_logs import summarize_request_logs
+from host_management.request_metrics import summarize_latency
+from host_management.statistics import (
+    get_cached_response, get_capacity_report, get_statistics_series, get_statistics_version, set_cached_response
 )
-from host_management.utils import ping_host
+from host_management.utils import get_client_ip
+from .permissions import CanRetrieveHostPasswords
+from .renderers import NDJSONRenderer, EventStreamRenderer
 
 
 class CityViewSet(viewsets.ModelViewSet):
@@ -37,13 +59,20 @@ class HostViewSet(viewsets.ModelViewSet):
     """主机视图集"""
     queryset = Host.objects.all()
     serializer_class = HostSerializer
+    # 批量探测时每批读取的主机数
+    ping_chunk_size = 5000
 
     def get_queryset(self):
         """支持按城市和机房过滤"""
-        queryset = Host.objects.all()
-        city_id = self.request.query_params.get('city_id', None)
-        data_center_id = self.request.query_params.get('data_center_id', None)
-        status_filter = self.request.query_params.get('status', None)
+        return self.filter_hosts(Host.objects.all(), self.request.query_params)
+
+    @staticmethod
+    def filter_hosts(queryset, params):
+        """按城市、机房、状态、可达性过滤主机（reachable=true/false/unknown）"""
+        city_id = params.get('city_id', None)
+        data_center_id = params.get('data_center_id', None)
+        status_filter = params.get('status', None)
+        reachable = params.get('reachable', None)
         
         if city_id:
             queryset = queryset.filter(city_id=city_id)
@@ -51,14 +80,29 @@ class HostViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(data_center_id=data_center_id)
         if status_filter:
             queryset = queryset.filter(status=status_filter)
+        if reachable in ('true', 'True', '1', True):
+            queryset = queryset.filter(reachable=True)
+        elif reachable in ('false', 'False', '0', False):
+            queryset = queryset.filter(reachable=False)
+        elif reachable == 'unknown':
+            queryset = queryset.filter(reachable__isnull=True)
         
         return queryset
 
+    @staticmethod
+    def is_fresh_request(params):
+        """?fresh=1 时跳过ping结果缓存"""
+        return params.get('fresh') in ('1', 'true', 'True', 1, True)
+
     @action(detail=True, methods=['get'])
     def ping(self, request, pk=None):
-        """探测主机是否ping可达"""
+        """探测主机是否ping可达（结果按IP缓存 PING_CACHE_TTL 秒，?fresh=1 跳过缓存）"""
         host = self.get_object()
-        result = ping_host(host.ip_address)
+        result, cached = cached_ping_host(
+            host.ip_address,
+            timeout=settings.PING_TIMEOUT,
+            fresh=self.is_fresh_request(request.query_params)
+        )
         
         return Response({
             'host_id': host.id,
@@ -66,15 +110,217 @@ class HostViewSet(viewsets.ModelViewSet):
             'ip_address': host.ip_address,
             'reachable': result['reachable'],
             'response_time_ms': result.get('response_time'),
-            'error': result.get('error')
+            'error': result.get('error'),
+            'cached': cached
         })
 
+    @action(
+        detail=False, methods=['post'], url_path='ping', url_name='bulk-ping',
+        renderer_classes=[JSONRenderer, NDJSONRenderer, EventStreamRenderer]
+    )
+    def bulk_ping(self, request):
+        """
+        批量并发探测主机是否ping可达
+        
+        过滤条件与列表接口一致（city_id、data_center_id、status），
+        可以放在查询参数或请求体中；缓存命中的主机直接返回缓存结果（fresh=1 跳过缓存）；
+        并发数由 PING_MAX_CONCURRENCY / PING_MAX_IN_FLIGHT 限制。
+        
+        Accept 为 application/x-ndjson 或 text/event-stream 时以流式返回，
+        每台主机探测完成即输出一条结果，最后输出汇总。
+        """
+        params = request.query_params.copy()
+        if isinstance(request.data, dict):
+            params.update({k: v for k, v in request.data.items() if v not in (None, '')})
+        queryset = self.filter_hosts(Host.objects.all(), params)
+        fresh = self.is_fresh_request(params)
+        
+        renderer = request.accepted_renderer
+        if isinstance(renderer, (NDJSONRenderer, EventStreamRenderer)):
+            response = StreamingHttpResponse(
+                self._stream_bulk_ping(queryset, fresh, renderer),
+                content_type=f'{renderer.media_type}; charset={renderer.charset}'
+            )
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+        
+        summary = {'total': 0, 'reachable': 0, 'unreachable': 0}
+        results = sorted(
+            self._iter_bulk_ping(queryset, fresh, summary),
+            key=lambda item: item['hostname']
+        )
+        return Response({'summary': summary, 'results': results})
+
+    def _stream_bulk_ping(self, queryset, fresh, renderer):
+        """按流式格式逐条输出批量探测结果"""
+        summary = {'total': 0, 'reachable': 0, 'unreachable': 0}
+        if isinstance(renderer, EventStreamRenderer):
+            for item in self._iter_bulk_ping(queryset, fresh, summary):
+                yield renderer.render_item(item, event='result')
+            yield renderer.render_item(summary, event='summary')
+        else:
+            for item in self._iter_bulk_ping(queryset, fresh, summary):
+                yield renderer.render_item(item)
+            yield renderer.render_item({'summary': summary})
+
+    def _iter_bulk_ping(self, queryset, fresh, summary):
+        """
+        按主键分批读取主机并并发探测，逐条产出每台主机的结果
+        
+        每批最多 ping_chunk_size 台主机，内存占用与主机总数无关；
+        探测结束后在 summary 中写入汇总计数和耗时。
+        """
+        start_time = time.time()
+        last_id = 0
+        while True:
+            hosts = list(
+                queryset.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'hostname', 'ip_address')[:self.ping_chunk_size]
+            )
+            if not hosts:
+                break
+            last_id = hosts[-1][0]
+            
+            hosts_by_ip = {}
+            for host_id, hostname, ip_address in hosts:
+                hosts_by_ip.setdefault(ip_address, []).append((host_id, hostname))
+            
+            for ip_address, result, cached in iter_cached_ping_hosts(
+                hosts_by_ip.keys(),
+                timeout=settings.PING_TIMEOUT,
+                fresh=fresh,
+                max_workers=settings.PING_MAX_CONCURRENCY,
+                max_in_flight=settings.PING_MAX_IN_FLIGHT
+            ):
+                for host_id, hostname in hosts_by_ip[ip_address]:
+                    summary['total'] += 1
+                    if result['reachable']:
+                        summary['reachable'] += 1
+                    else:
+                        summary['unreachable'] += 1
+                    yield {
+                        'host_id': host_id,
+                        'hostname': hostname,
+                        'ip_address': ip_address,
+                        'reachable': result['reachable'],
+                        'response_time_ms': result.get('response_time'),
+                        'error': result.get('error'),
+                        'cached': cached
+                    }
+        summary['duration_ms'] = round((time.time() - start_time) * 1000, 2)
+
+    @action(detail=False, methods=['get'], url_path='ping-stats')
+    def ping_stats(self, request):
+        """ping结果缓存的命中统计"""
+        return Response(get_cache_stats())
+
 
 class HostPasswordViewSet(viewsets.ReadOnlyModelViewSet):
-    """主机密码视图集（只读，密码不返回）"""
+    """主机密码视图集（只读，列表和详情不返回密码，明文只能通过 secrets 接口获取）"""
     queryset = HostPassword.objects.all()
     serializer_class = HostPasswordSerializer
 
+    @action(
+        detail=False, methods=['post'], url_path='secrets', url_name='secrets',
+        permission_classes=[CanRetrieveHostPasswords],
+        renderer_classes=[JSONRenderer, NDJSONRenderer]
+    )
+    def secrets(self, request):
+        """
+        批量获取主机密码明文（需要 host_management.retrieve_password 权限）
+        
+        请求体传 host_ids 列表，或与主机列表接口一致的过滤条件（city_id、data_center_id、
+        status、reachable），至少指定一项；一次最多 PASSWORD_RETRIEVAL_MAX_HOSTS 台主机。
+        传 as_of（ISO 8601时间）时从密码历史中取该时刻使用的密码，用于恢复轮换未生效的主机。
+        结果以NDJSON流式返回，每台主机一行，最后一行为汇总；
+        每批结果输出前先批量写入 PasswordAccessLog 审计记录。
+        """
+        params = request.data if isinstance(request.data, dict) else {}
+        host_ids = params.get('host_ids')
+        filters = {
+            key: params[key]
+            for key in ('city_id', 'data_center_id', 'status', 'reachable')
+            if params.get(key) not in (None, '')
+        }
+        if host_ids is None and not filters:
+            return Response(
+                {'error': '需要指定 host_ids 或过滤条件（city_id、data_center_id、status、reachable）'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        queryset = HostViewSet.filter_hosts(Host.objects.all(), filters)
+        if host_ids is not None:
+            if not isinstance(host_ids, list) or not all(isinstance(host_id, int) for host_id in host_ids):
+                return Response({'error': 'host_ids 必须是整数列表'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(id__in=host_ids)
+        
+        as_of = params.get('as_of')
+        if as_of not in (None, ''):
+            try:
+                as_of = parse_datetime(str(as_of))
+            except ValueError:
+                as_of = None
+            if as_of is None:
+                return Response({'error': 'as_of 必须是ISO 8601格式的时间'}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(as_of):
+                as_of = timezone.make_aware(as_of)
+        else:
+            as_of = None
+        
+        max_hosts = settings.PASSWORD_RETRIEVAL_MAX_HOSTS
+        if as_of is None:
+            rows_queryset = HostPassword.objects.filter(host__in=queryset).order_by('host_id').values_list(
+                'host_id', 'host__hostname', 'host__ip_address',
+                'password_changed_at', 'encrypted_password'
+            )
+        else:
+            # 每台主机在 (host, -changed_at) 索引上取 as_of 之前最新的一条历史
+            history = HostPasswordHistory.objects.filter(
+                host_id=OuterRef('id'), changed_at__lte=as_of
+            ).order_by('-changed_at')
+            rows_queryset = queryset.annotate(
+                history_changed_at=Subquery(history.values('changed_at')[:1]),
+                history_password=Subquery(history.values('encrypted_password')[:1])
+            ).filter(history_password__isnull=False).order_by('id').values_list(
+                'id', 'hostname', 'ip_address', 'history_changed_at', 'history_password'
+            )
+        rows = list(rows_queryset[:max_hosts + 1])
+        if len(rows) > max_hosts:
+            return Response(
+                {'error': f'一次最多获取 {max_hosts} 台主机的密码，请缩小范围'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        renderer = NDJSONRenderer()
+        response = StreamingHttpResponse(
+            self._stream_secrets(rows, request.user, get_client_ip(request), renderer),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Cache-Control'] = 'no-store'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @staticmethod
+    def _stream_secrets(rows, user, ip_address, renderer):
+        """分批解密并写审计记录，逐条输出密码"""
+        summary = {'total': 0, 'failed': 0}
+        for items in iter_decrypted_passwords(
+            rows,
+            chunk_size=settings.PASSWORD_RETRIEVAL_CHUNK_SIZE,
+            max_workers=settings.PASSWORD_RETRIEVAL_MAX_WORKERS,
+            parallel_threshold=settings.PASSWORD_RETRIEVAL_PARALLEL_THRESHOLD
+        ):
+            record_password_access(user, ip_address, items)
+            for item in items:
+                summary['total'] += 1
+                if item['password'] is None:
+                    summary['failed'] += 1
+                    item['error'] = '密码无法解密'
+                yield renderer.render_item(item)
+        yield renderer.render_item({'summary': summary})
+
 
 class HostStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
     """主机统计视图集（只读）"""
@@ -83,7 +329,7 @@ class HostStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         """支持按日期、城市、机房过滤"""
-        queryset = HostStatistics.objects.all()
+        queryset = HostStatistics.objects.select_related('city', 'data_center')
         city_id = self.request.query_params.get('city_id', None)
         data_center_id = self.request.query_params.get('data_center_id', None)
         statistics_date = self.request.query_params.get('statistics_date', None)
@@ -97,3 +343,201 @@ class HostStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
         
         return queryset
 
+    @staticmethod
+    def parse_statistics_date(params):
+        """解析 statistics_date 参数，未指定返回None，格式错误抛出 ValueError"""
+        value = params.get('statistics_date')
+        if not value:
+            return None
+        try:
+            statistics_date = parse_date(value)
+        except ValueError:
+            statistics_date = None
+        if statistics_date is None:
+            raise ValueError('statistics_date 必须是 YYYY-MM-DD 格式的日期')
+        return statistics_date
+
+    def conditional_response(self, request, statistics_date, build):
+        """
+        按统计日期的版本号生成强 ETag，返回缓存的响应或304
+
+        ETag 由请求路径（含查询参数）和该日期的版本号计算（一次索引上的聚合查询）；
+        If-None-Match 命中时直接返回304，否则读取按 ETag 缓存的响应，未命中才调用 build() 生成。
+        已结束的日期（今天之前）不会再变化，允许客户端缓存 STATISTICS_CACHE_MAX_AGE 秒；
+        今天及以后的日期要求客户端每次重新验证，统计任务写入后版本号变化，ETag 随之失效。
+        """
+        version = get_statistics_version(statistics_date)
+        etag = '"%s"' % hashlib.sha256(f'{request.get_full_path()}|{version}'.encode()).hexdigest()[:32]
+        if statistics_date < timezone.localdate():
+            cache_control = f'public, max-age={settings.STATISTICS_CACHE_MAX_AGE}'
+        else:
+            cache_control = 'no-cache'
+        headers = {'ETag': etag, 'Cache-Control': cache_control}
+
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        data = get_cached_response(etag)
+        if data is None:
+            data = build()
+            set_cached_response(etag, data, settings.STATISTICS_CACHE_TIMEOUT)
+        return Response(data, headers=headers)
+
+    def list(self, request, *args, **kwargs):
+        """指定 statistics_date 时支持 ETag 条件请求和响应缓存"""
+        try:
+            statistics_date = self.parse_statistics_date(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if statistics_date is None:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(
+            request,
+            statistics_date,
+            lambda: super(HostStatisticsViewSet, self).list(request, *args, **kwargs).data
+        )
+
+    @action(detail=False, methods=['get'])
+    def live(self, request):
+        """
+        当前的主机数量（读取实时计数表，不扫描主机表）
+
+        支持按城市、机房过滤，返回每个（城市, 机房）的计数和合计
+        """
+        queryset = HostCounter.objects.select_related('city', 'data_center')
+        city_id = request.query_params.get('city_id', None)
+        data_center_id = request.query_params.get('data_center_id', None)
+        if city_id:
+            queryset = queryset.filter(city_id=city_id)
+        if data_center_id:
+            queryset = queryset.filter(data_center_id=data_center_id)
+
+        results = HostCounterSerializer(queryset, many=True).data
+        return Response({
+            'host_count': sum(item['host_count'] for item in results),
+            'active_host_count': sum(item['active_host_count'] for item in results),
+            'results': results,
+        })
+
+    @action(detail=False, methods=['get'], url_path='range', url_name='range')
+    def range_series(self, request):
+        """
+        按时间范围查询主机数量序列（列式返回，不分页）
+
+        参数: from、to（YYYY-MM-DD，必填）；granularity（day/week/month/quarter/year/auto，默认auto）；
+        group_by（city/data_center，默认data_center）；city_id、data_center_id 过滤。
+        按粒度读取最粗的可用汇总表，日粒度以外的值为周期内的日均主机数量。
+        """
+        params = request.query_params
+        try:
+            date_from = parse_date(params.get('from', ''))
+            date_to = parse_date(params.get('to', ''))
+        except ValueError:
+            date_from = date_to = None
+        if date_from is None or date_to is None:
+            return Response({'error': 'from 和 to 必须是 YYYY-MM-DD 格式的日期'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            series = get_statistics_series(
+                date_from,
+                date_to,
+                granularity=params.get('granularity', 'auto'),
+                group_by=params.get('group_by', 'data_center'),
+                city_id=params.get('city_id') or None,
+                data_center_id=params.get('data_center_id') or None
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(series)
+
+    @action(detail=False, methods=['get'])
+    def capacity(self, request):
+        """
+        某一天的容量统计（CPU、内存、磁盘合计以及按状态和操作系统的主机分布）
+
+        参数: statistics_date（YYYY-MM-DD，默认最近一次统计的日期）；group_by（city/data_center，默认data_center）；
+        city_id、data_center_id 过滤。只读取该日期的统计记录，返回各分组和合计。
+        """
+        params = request.query_params
+        try:
+            statistics_date = self.parse_statistics_date(params)
+
+            def build():
+                return get_capacity_report(
+                    statistics_date,
+                    group_by=params.get('group_by', 'data_center'),
+                    city_id=params.get('city_id') or None,
+                    data_center_id=params.get('data_center_id') or None
+                )
+
+            if statistics_date is None:
+                # 最近一次统计的日期需要查询数据库才能确定，不走条件请求
+                return Response(build())
+            return self.conditional_response(request, statistics_date, build)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RequestLatencyViewSet(viewsets.ViewSet):
+    """请求耗时分位数视图集（默认读取分钟汇总，不扫描请求日志）"""
+
+    @staticmethod
+    def parse_time(value, name):
+        value = parse_datetime(value)
+        if value is None:
+            raise ValueError(f'{name} 必须是ISO 8601格式的时间')
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
+    def list(self, request):
+        """
+        按（路由, 方法, 状态码类别）返回请求次数、平均耗时、最大耗时和 p50/p95/p99
+
+        参数: since、until（ISO 8601，默认最近 REQUEST_METRICS_DEFAULT_WINDOW 秒）；
+        route（路由模板包含匹配）、view_name、method、status_class（如 5）过滤；
+        source（rollups/logs，默认rollups）。
+        rollups: 分位数在对数刻度桶内插值估算（桶边界相差√2倍）；当前分钟尚未写入的耗时不包含在内。
+        logs: 从采样写入的请求日志按采样权重估算（扫描时间范围内的日志，返回值另有实际日志条数 sampled）。
+        """
+        params = request.query_params
+        try:
+            until = self.parse_time(params['until'], 'until') if params.get('until') else timezone.now()
+            if params.get('since'):
+                since = self.parse_time(params['since'], 'since')
+            else:
+                since = until - timedelta(seconds=settings.REQUEST_METRICS_DEFAULT_WINDOW)
+            if since > until:
+                raise ValueError('since 不能晚于 until')
+            status_class = params.get('status_class')
+            if status_class and not status_class.isdigit():
+                raise ValueError('status_class 必须是数字（如 5 表示5xx）')
+            source = params.get('source', 'rollups')
+            if source not in ('rollups', 'logs'):
+                raise ValueError('source 必须是 rollups 或 logs')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if source == 'logs':
+            queryset = RequestLog.objects.filter(created_at__gte=since, created_at__lt=until)
+            if status_class:
+                status_class = int(status_class)
+                queryset = queryset.filter(status_code__gte=status_class * 100, status_code__lt=status_class * 100 + 100)
+        else:
+            queryset = RequestLatencyRollup.objects.filter(minute__gte=since, minute__lt=until)
+            if status_class:
+                queryset = queryset.filter(status_class=int(status_class))
+        if params.get('route'):
+            queryset = queryset.filter(route__route__contains=params['route'])
+        if params.get('view_name'):
+            queryset = queryset.filter(route__view_name=params['view_name'])
+        if params.get('method'):
+            queryset = queryset.filter(method=params['method'].upper())
+
+        return Response({
+            'since': since,
+            'until': until,
+            'source': source,
+            'results': summarize_request_logs(queryset) if source == 'logs' else summarize_latency(queryset),
+        })
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 from celery.schedules import crontab
 
@@ -144,21 +145,127 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# 设置 CELERY_TASK_ALWAYS_EAGER=1 时任务在当前进程同步执行（本地调试和测试用，不需要Redis）
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER') == '1'
+if CELERY_TASK_ALWAYS_EAGER:
+    CELERY_BROKER_URL = 'memory://'
+    CELERY_RESULT_BACKEND = 'cache+memory://'
 
 # Celery定时任务配置
 CELERY_BEAT_SCHEDULE = {
-    'update-host-passwords-every-8-hours': {
-        'task': 'host_management.celery_tasks.update_host_passwords',
-        'schedule': 28800.0,  # 每8小时执行一次
+    'rotate-due-host-passwords-every-minute': {
+        'task': 'host_management.celery_tasks.rotate_due_host_passwords_tick',
+        'schedule': 60.0,  # 每分钟执行一次，与PASSWORD_ROTATION_TICK_INTERVAL保持一致
+        'options': {'expires': 60},  # 积压的轮换任务过期丢弃
+    },
+    'resume-password-rotation-runs-every-5-minutes': {
+        'task': 'host_management.celery_tasks.resume_password_rotation_runs',
+        'schedule': 300.0,  # 每5分钟检查一次中断的密码全量轮换
+        'options': {'expires': 300},
     },
     'generate-host-statistics-daily-at-midnight': {
         'task': 'host_management.celery_tasks.generate_host_statistics',
         'schedule': crontab(hour=0, minute=0),  # 每天00:00执行
     },
+    'reconcile-host-counters-every-10-minutes': {
+        'task': 'host_management.celery_tasks.reconcile_host_counters_task',
+        'schedule': 600.0,  # 每10分钟执行一次，与HOST_COUNTER_RECONCILE_INTERVAL保持一致
+        'options': {'expires': 600},
+    },
+    'sweep-host-reachability-every-5-minutes': {
+        'task': 'host_management.celery_tasks.sweep_host_reachability',
+        'schedule': 300.0,  # 每5分钟执行一次，与HOST_SWEEP_INTERVAL保持一致
+        'options': {'expires': 300},  # 积压的巡检任务过期丢弃
+    },
+    'purge-expired-host-probes-daily': {
+        'task': 'host_management.celery_tasks.purge_expired_host_probes',
+        'schedule': crontab(hour=3, minute=0),  # 每天03:00执行
+    },
+    'purge-expired-password-history-daily': {
+        'task': 'host_management.celery_tasks.purge_expired_password_history',
+        'schedule': crontab(hour=3, minute=30),  # 每天03:30执行
+    },
+    'purge-expired-request-latency-rollups-daily': {
+        'task': 'host_management.celery_tasks.purge_expired_request_latency_rollups',
+        'schedule': crontab(hour=4, minute=0),  # 每天04:00执行
+    },
 }
 
+# 密码轮换配置
+PASSWORD_ROTATION_INTERVAL = 28800  # 每台主机的密码轮换周期（秒），上次修改密码后到期
+PASSWORD_ROTATION_TICK_INTERVAL = 60  # 到期密码轮换的执行间隔（秒）
+PASSWORD_ROTATION_MAX_PER_TICK = None  # 每次最多轮换的主机数，None表示按主机总数均分到整个周期
+# 轮换生成的密码策略：长度、使用的字符类别（lower/upper/digit/symbol）、必须包含的字符类别、是否排除易混淆字符
+PASSWORD_POLICY = {
+    'length': 16,
+    'classes': ['lower', 'upper', 'digit', 'symbol'],
+    'require_classes': ['lower', 'upper', 'digit', 'symbol'],
+    'exclude_ambiguous': False,
+}
+PASSWORD_ROTATION_CHUNK_SIZE = 1000  # 每批轮换的主机数（每批一个事务）
+PASSWORD_ROTATION_SHARD_SIZE = 20000  # 每个分片任务轮换的主机数（分片由各worker并行执行）
+PASSWORD_HISTORY_RETENTION_DAYS = 30  # 密码历史保留天数（每台主机最新的一条始终保留）
+PASSWORD_ROTATION_RUN_STALE_AFTER = 300  # 分片超过该秒数没有更新检查点视为中断，从检查点续跑
+
+# 请求日志配置（RequestTimingMiddleware）
+REQUEST_LOG_ASYNC = True  # 由后台线程批量写入；为False时在请求中同步写入
+REQUEST_LOG_BATCH_SIZE = 500  # 每批写入的最大条数
+REQUEST_LOG_FLUSH_INTERVAL_MS = 1000  # 最长写入间隔（毫秒）
+REQUEST_LOG_QUEUE_SIZE = 10000  # 队列容量，写入跟不上时超出的日志被丢弃并计数
+REQUEST_LOG_SAMPLE_RATE = 0.01  # 普通请求写入请求日志的采样率（0-1），写入的日志带权重 1/采样率
+REQUEST_LOG_ROUTE_SAMPLE_RATES = {}  # 按路由模板或视图名单独设置采样率，如 {'api/hosts/<pk>/ping/': 0.001}
+REQUEST_LOG_SLOW_THRESHOLD_MS = 500  # 耗时不低于该值（毫秒）的请求总是写入；5xx响应也总是写入
+REQUEST_SERVER_TIMING_HEADER = True  # 是否在响应中返回 Server-Timing 头（SQL次数和耗时、请求总耗时）
+REQUEST_METRICS_FLUSH_INTERVAL = 60  # 进程内耗时直方图写入分钟汇总的间隔（秒）
+REQUEST_METRICS_RETENTION_DAYS = 30  # 请求耗时汇总保留天数
+REQUEST_METRICS_DEFAULT_WINDOW = 3600  # 耗时分位数接口默认统计最近多少秒
+
+# 主机实时计数配置
+HOST_COUNTER_RECONCILE_INTERVAL = 600  # 实时计数全量校对间隔（秒）
+
+# 统计时间范围查询配置
+STATISTICS_RANGE_MAX_PERIODS = 1000  # 一次查询最多返回的周期数
+STATISTICS_RANGE_AUTO_PERIODS = 120  # granularity=auto 时选择周期数不超过该值的最细粒度
+STATISTICS_CACHE_TIMEOUT = 86400  # 统计接口响应在缓存中的保存时间（秒），按 ETag 缓存，统计更新后 ETag 随之变化
+STATISTICS_CACHE_MAX_AGE = 604800  # 已结束日期的统计响应允许客户端缓存的时间（秒）
+
+# 主机可达性巡检配置
+HOST_SWEEP_INTERVAL = 300  # 巡检间隔（秒）
+HOST_SWEEP_CHUNK_SIZE = 5000  # 每批探测的主机数
+HOST_SWEEP_TIMEOUT = 1  # 巡检时单次探测超时时间（秒）
+HOST_SWEEP_MAX_IN_FLIGHT = 4096  # 巡检时ICMP套接字的最大在途请求数
+HOST_PROBE_RETENTION_DAYS = 7  # 探测记录保留天数
+
+# 主机ping探测配置
+PING_BACKEND = 'auto'  # auto: 优先使用进程内ICMP套接字，不可用时回退到ping命令；也可指定icmp/subprocess
+PING_TIMEOUT = 3  # 单次探测超时时间（秒）
+PING_MAX_CONCURRENCY = 64  # 回退到ping命令时批量探测的最大并发进程数
+PING_MAX_IN_FLIGHT = 1024  # 使用ICMP套接字时批量探测的最大在途请求数
+PING_CACHE_TTL = 30  # ping结果缓存时间（秒）
+PING_CACHE_NEGATIVE_TTL = 5  # 不可达（含超时、出错）的ping结果缓存时间（秒）
+
+# 缓存配置（多进程部署时配置REDIS_CACHE_URL，使各worker共享ping结果等缓存）
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.environ.get('REDIS_CACHE_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_CACHE_URL'],
+    }
+
 # 密码加密密钥（生产环境应该从环境变量获取）
 ENCRYPTION_KEY = None  # 如果为None，将自动生成（仅用于开发环境）
+# 已退役的加密密钥（逗号分隔），只用于解密旧密码，由 reencrypt_host_passwords_task 重新加密为当前密钥
+ENCRYPTION_RETIRED_KEYS = [key for key in os.environ.get('ENCRYPTION_RETIRED_KEYS', '').split(',') if key]
+PASSWORD_RETRIEVAL_MAX_HOSTS = 5000  # 批量获取密码明文时一次最多的主机数
+PASSWORD_RETRIEVAL_CHUNK_SIZE = 500  # 批量获取密码时每批解密并写审计记录的条数
+PASSWORD_RETRIEVAL_MAX_WORKERS = 8  # 批量获取密码时解密线程数
+PASSWORD_RETRIEVAL_PARALLEL_THRESHOLD = 2000  # 主机数达到该值时使用线程池解密
+KEY_ROTATION_CHUNK_SIZE = 1000  # 密钥轮换时每批重新加密的密码记录数
+KEY_ROTATION_LOCK_TIMEOUT = 3600  # 密钥轮换任务锁的租约时长（秒），执行期间自动续期，进程异常退出后最多该时长后释放
 
 # 日志配置
 LOGGING = {
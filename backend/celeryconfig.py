@@ -20,13 +20,41 @@ accept_content = ['json']
 
 # 定时任务配置
 beat_schedule = {
-    'update-host-passwords-every-8-hours': {
-        'task': 'host_management.celery_tasks.update_host_passwords',
-        'schedule': 28800.0,  # 每8小时执行一次
+    'rotate-due-host-passwords-every-minute': {
+        'task': 'host_management.celery_tasks.rotate_due_host_passwords_tick',
+        'schedule': 60.0,  # 每分钟执行一次
+        'options': {'expires': 60},  # 积压的轮换任务过期丢弃
+    },
+    'resume-password-rotation-runs-every-5-minutes': {
+        'task': 'host_management.celery_tasks.resume_password_rotation_runs',
+        'schedule': 300.0,  # 每5分钟检查一次中断的密码全量轮换
+        'options': {'expires': 300},
     },
     'generate-host-statistics-daily-at-midnight': {
         'task': 'host_management.celery_tasks.generate_host_statistics',
         'schedule': crontab(hour=0, minute=0),  # 每天00:00执行
     },
+    'reconcile-host-counters-every-10-minutes': {
+        'task': 'host_management.celery_tasks.reconcile_host_counters_task',
+        'schedule': 600.0,  # 每10分钟执行一次
+        'options': {'expires': 600},
+    },
+    'sweep-host-reachability-every-5-minutes': {
+        'task': 'host_management.celery_tasks.sweep_host_reachability',
+        'schedule': 300.0,  # 每5分钟执行一次
+        'options': {'expires': 300},  # 积压的巡检任务过期丢弃
+    },
+    'purge-expired-host-probes-daily': {
+        'task': 'host_management.celery_tasks.purge_expired_host_probes',
+        'schedule': crontab(hour=3, minute=0),  # 每天03:00执行
+    },
+    'purge-expired-password-history-daily': {
+        'task': 'host_management.celery_tasks.purge_expired_password_history',
+        'schedule': crontab(hour=3, minute=30),  # 每天03:30执行
+    },
+    'purge-expired-request-latency-rollups-daily': {
+        'task': 'host_management.celery_tasks.purge_expired_request_latency_rollups',
+        'schedule': crontab(hour=4, minute=0),  # 每天04:00执行
+    },
 }
 
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import City, DataCenter, Host, HostPassword, HostStatistics, RequestLog
+from .models import (
+    City, DataCenter, Host, HostProbe, HostPassword, HostPasswordHistory, PasswordAccessLog, PasswordRotationRun, KeyRotationRun, HostCounter, HostStatistics,
+    HostStatisticsRollup, RequestLog, RequestLatencyRollup, RequestRoute
+)
+from .request_metrics import estimate_percentile
 
 
 @admin.register(City)
@@ -18,10 +22,19 @@ class DataCenterAdmin(admin.ModelAdmin):
 
 @admin.register(Host)
 class HostAdmin(admin.ModelAdmin):
-    list_display = ['hostname', 'ip_address', 'city', 'data_center', 'status', 'created_at']
+    list_display = ['hostname', 'ip_address', 'city', 'data_center', 'status', 'reachable', 'last_seen_at', 'created_at']
     search_fields = ['hostname', 'ip_address']
-    list_filter = ['city', 'data_center', 'status', 'created_at']
-    readonly_fields = ['created_at', 'updated_at']
+    list_filter = ['city', 'data_center', 'status', 'reachable', 'created_at']
+    readonly_fields = ['reachable', 'last_seen_at', 'last_rtt_ms', 'created_at', 'updated_at']
+
+
+@admin.register(HostProbe)
+class HostProbeAdmin(admin.ModelAdmin):
+    list_display = ['host', 'reachable', 'rtt_ms', 'probed_at']
+    list_filter = ['reachable', 'probed_at']
+    search_fields = ['host__hostname']
+    raw_id_fields = ['host']
+    date_hierarchy = 'probed_at'
 
 
 @admin.register(HostPassword)
@@ -31,6 +44,95 @@ class HostPasswordAdmin(admin.ModelAdmin):
     search_fields = ['host__hostname']
 
 
+@admin.register(HostPasswordHistory)
+class HostPasswordHistoryAdmin(admin.ModelAdmin):
+    list_display = ['host', 'changed_at']
+    search_fields = ['host__hostname']
+    raw_id_fields = ['host']
+    exclude = ['encrypted_password']
+    readonly_fields = ['host', 'changed_at']
+    date_hierarchy = 'changed_at'
+
+    # 历史只追加，过期记录由定时任务按保留期清理
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PasswordAccessLog)
+class PasswordAccessLogAdmin(admin.ModelAdmin):
+    list_display = ['username', 'hostname', 'ip_address', 'accessed_at']
+    search_fields = ['username', 'hostname']
+    readonly_fields = ['user', 'username', 'host', 'hostname', 'ip_address', 'accessed_at']
+    date_hierarchy = 'accessed_at'
+
+    # 审计日志只读，不允许在后台新增、修改或删除
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PasswordRotationRun)
+class PasswordRotationRunAdmin(admin.ModelAdmin):
+    list_display = [
+        'id', 'start_id', 'end_id', 'status', 'progress_display', 'host_count',
+        'created_count', 'updated_count', 'failed_count', 'last_host_id', 'started_at', 'updated_at'
+    ]
+    list_filter = ['status', 'started_at']
+    readonly_fields = [
+        'start_id', 'end_id', 'host_count', 'last_host_id', 'created_count', 'updated_count',
+        'failed_count', 'errors', 'status', 'started_at', 'updated_at', 'finished_at'
+    ]
+    date_hierarchy = 'started_at'
+
+    @admin.display(description='进度')
+    def progress_display(self, obj):
+        return f'{obj.progress:.1%}'
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(KeyRotationRun)
+class KeyRotationRunAdmin(admin.ModelAdmin):
+    list_display = [
+        'id', 'status', 'progress_display', 'total_count', 'reencrypted_count',
+        'skipped_count', 'failed_count', 'started_at', 'updated_at', 'finished_at'
+    ]
+    list_filter = ['status', 'started_at']
+    readonly_fields = [
+        'total_count', 'last_password_id', 'last_history_id', 'reencrypted_count', 'skipped_count',
+        'failed_count', 'errors', 'status', 'started_at', 'updated_at', 'finished_at'
+    ]
+
+    @admin.display(description='进度')
+    def progress_display(self, obj):
+        return f'{obj.progress:.1%}'
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(HostCounter)
+class HostCounterAdmin(admin.ModelAdmin):
+    list_display = ['city', 'data_center', 'host_count', 'active_host_count', 'updated_at']
+    list_filter = ['city']
+    readonly_fields = ['city', 'data_center', 'host_count', 'active_host_count', 'updated_at']
+
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(HostStatistics)
 class HostStatisticsAdmin(admin.ModelAdmin):
     list_display = ['city', 'data_center', 'host_count', 'active_host_count', 'statistics_date']
@@ -38,10 +140,79 @@ class HostStatisticsAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
 
 
+@admin.register(HostStatisticsRollup)
+class HostStatisticsRollupAdmin(admin.ModelAdmin):
+    list_display = [
+        'granularity', 'period_start', 'city', 'data_center', 'day_count',
+        'host_count_sum', 'active_host_count_sum', 'updated_at'
+    ]
+    list_filter = ['granularity', 'period_start', 'city']
+    readonly_fields = [
+        'granularity', 'period_start', 'city', 'data_center', 'day_count',
+        'host_count_sum', 'active_host_count_sum', 'updated_at'
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(RequestRoute)
+class RequestRouteAdmin(admin.ModelAdmin):
+    list_display = ['route', 'view_name', 'created_at']
+    search_fields = ['route', 'view_name']
+    readonly_fields = ['route', 'view_name', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(RequestLog)
 class RequestLogAdmin(admin.ModelAdmin):
-    list_display = ['path', 'method', 'status_code', 'duration_ms', 'created_at']
-    list_filter = ['method', 'status_code', 'created_at']
+    list_display = [
+        'path', 'route', 'method', 'status_code', 'duration_ms', 'query_count', 'sql_duration_ms',
+        'sample_weight', 'created_at'
+    ]
+    list_filter = ['method', 'status_code', 'created_at', 'route']
+    list_select_related = ['route']
     search_fields = ['path']
     readonly_fields = ['created_at']
     date_hierarchy = 'created_at'
+
+
+@admin.register(RequestLatencyRollup)
+class RequestLatencyRollupAdmin(admin.ModelAdmin):
+    list_display = [
+        'minute', 'route', 'method', 'status_class', 'count', 'avg_display',
+        'p50_display', 'p95_display', 'p99_display', 'duration_max_ms'
+    ]
+    list_filter = ['method', 'status_class', 'minute']
+    list_select_related = ['route']
+    search_fields = ['route__route', 'route__view_name']
+    date_hierarchy = 'minute'
+    readonly_fields = [
+        'minute', 'route', 'method', 'status_class', 'count',
+        'duration_sum_ms', 'duration_max_ms', 'buckets'
+    ]
+
+    def _percentile(self, obj, percentile):
+        value = estimate_percentile(obj.buckets, obj.count, obj.duration_max_ms, percentile)
+        return f'{value:.2f}' if value is not None else '-'
+
+    @admin.display(description='平均耗时(毫秒)')
+    def avg_display(self, obj):
+        return f'{obj.duration_sum_ms / obj.count:.2f}' if obj.count else '-'
+
+    @admin.display(description='p50(毫秒)')
+    def p50_display(self, obj):
+        return self._percentile(obj, 50)
+
+    @admin.display(description='p95(毫秒)')
+    def p95_display(self, obj):
+        return self._percentile(obj, 95)
+
+    @admin.display(description='p99(毫秒)')
+    def p99_display(self, obj):
+        return self._percentile(obj, 99)
+
+    def has_add_permission(self, request):
+        return False
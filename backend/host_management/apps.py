@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 
 
 class HostManagementConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "host_management"
+
+    def ready(self):
+        from . import checks, counters  # noqa: F401  checks 导入时注册系统检查
+        from .models import Host
+        # 单个主机的增删改通过信号维护实时计数，批量操作由 HostQuerySet 处理
+        pre_save.connect(counters.host_pre_save, sender=Host, dispatch_uid='host_counter_pre_save')
+        post_save.connect(counters.host_post_save, sender=Host, dispatch_uid='host_counter_post_save')
+        pre_delete.connect(counters.host_pre_delete, sender=Host, dispatch_uid='host_counter_pre_delete')
+        post_delete.connect(counters.host_post_delete, sender=Host, dispatch_uid='host_counter_post_delete')
@@ -3,6 +3,7 @@ Celery配置模块
 """
 import os
 from celery import Celery
+from celery.signals import worker_process_shutdown
 
 # 设置Django默认设置模块
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
@@ -17,3 +18,11 @@ app.autodiscover_tasks([
     "host_management.celery_tasks",
 ])
 
+
+@worker_process_shutdown.connect
+def flush_request_logs(**kwargs):
+    """worker 子进程退出时不执行 atexit，在这里写入后台队列中剩余的请求日志和耗时直方图"""
+    from .request_logs import shutdown_request_log_writer
+    from .request_metrics import shutdown_latency_histograms
+    shutdown_request_log_writer()
+    shutdown_latency_histograms()
@@ -1,98 +1,372 @@
 """
 Celery定时任务模块
 """
-from celery import shared_task
+from celery import chord, shared_task
+from django.conf import settings
 from django.utils import timezone
 from datetime import date, timedelta
-from .models import Host, HostPassword, HostStatistics, City, DataCenter
-from .utils import generate_random_password
+from .models import HostPassword, HostPasswordHistory, PasswordRotationRun, KeyRotationRun
+from .passwords import (
+    start_rotation_runs, get_stale_rotation_runs, finish_rotation_run, rotate_host_passwords,
+    get_due_rotation_limit, rotate_due_host_passwords, reencrypt_host_passwords, purge_password_history
+)
+from .reachability import sweep_hosts, purge_host_probes
+from .counters import reconcile_host_counters
+from .request_metrics import purge_latency_rollups
+from .statistics import backfill_statistics, generate_statistics, refresh_rollups
+from .utils import task_lock
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _dispatch_rotation_runs(runs):
+    """把每条轮换记录作为独立的分片任务分发，全部结束后汇总"""
+    chord(
+        rotate_host_password_shard.s(run.id) for run in runs
+    )(summarize_password_rotation.s())
+
+
 @shared_task
 def update_host_passwords():
     """
-    每隔8小时随机修改每台主机的密码并加密记录
+    立即随机修改每台主机的密码并加密记录（全量轮换，需要时手动触发）
+    
+    定时轮换由 rotate_due_host_passwords_tick 按到期时间分散执行；
+    全量轮换按主键范围把主机切分为 PASSWORD_ROTATION_SHARD_SIZE 台一片，每个分片创建一条
+    PasswordRotationRun 并作为独立任务分发到各worker并行执行，全部分片结束后由
+    summarize_password_rotation 汇总。上一次全量轮换还有未结束的分片时不开始新的轮换，
+    中断的分片从检查点续跑
     """
     try:
-        hosts = Host.objects.all()
-        updated_count = 0
-        
-        for host in hosts:
-            try:
-                # 生成新密码
-                new_password = generate_random_password(length=16)
-                
-                # 获取或创建密码记录
-                password_record, created = HostPassword.objects.get_or_create(
-                    host=host,
-                    defaults={'encrypted_password': ''}
-                )
-                
-                # 设置新密码（会自动加密）
-                password_record.set_password(new_password)
-                updated_count += 1
-                
-                logger.info(f"已更新主机 {host.hostname} 的密码")
-            except Exception as e:
-                logger.error(f"更新主机 {host.hostname} 密码失败: {str(e)}")
-                continue
+        if PasswordRotationRun.objects.filter(status='running').exists():
+            runs = list(get_stale_rotation_runs(settings.PASSWORD_ROTATION_RUN_STALE_AFTER))
+            if not runs:
+                logger.warning("上一次密码全量轮换尚未结束，跳过本次")
+                return "上一次密码全量轮换尚未结束，跳过本次"
+            _dispatch_rotation_runs(runs)
+            logger.info(f"上一次密码全量轮换有 {len(runs)} 个分片中断，已从检查点续跑")
+            return f"已续跑 {len(runs)} 个中断的密码更新分片"
         
-        logger.info(f"密码更新任务完成，共更新 {updated_count} 台主机")
-        return f"成功更新 {updated_count} 台主机的密码"
+        runs = start_rotation_runs(shard_size=settings.PASSWORD_ROTATION_SHARD_SIZE)
     except Exception as e:
         logger.error(f"密码更新任务执行失败: {str(e)}")
         raise
+    
+    if not runs:
+        logger.info("没有需要更新密码的主机")
+        return "没有需要更新密码的主机"
+    
+    _dispatch_rotation_runs(runs)
+    logger.info(f"密码更新任务已分发，共 {len(runs)} 个分片")
+    return f"已分发 {len(runs)} 个密码更新分片"
 
 
 @shared_task
-def generate_host_statistics():
+def resume_password_rotation_runs():
     """
-    每天00:00按城市和机房维度统计主机数量，并把统计数据写入数据库
+    定时检查中断的密码轮换分片，从检查点续跑
     """
-    try:
-        today = date.today()
-        
-        # 获取所有城市和机房的组合
-        cities = City.objects.all()
+    runs = list(get_stale_rotation_runs(settings.PASSWORD_ROTATION_RUN_STALE_AFTER))
+    if not runs:
+        return "没有中断的密码更新分片"
+    _dispatch_rotation_runs(runs)
+    logger.info(f"发现 {len(runs)} 个中断的密码更新分片，已从检查点续跑")
+    return f"已续跑 {len(runs)} 个中断的密码更新分片"
+
+
+def _rotation_run_result(run, error=None):
+    """轮换记录转换为分片任务的返回值"""
+    result = {
+        'run_id': run.id,
+        'start_id': run.start_id,
+        'end_id': run.end_id,
+        'total': run.created_count + run.updated_count,
+        'created': run.created_count,
+        'updated': run.updated_count,
+        'failed': run.failed_count,
+    }
+    if error is not None:
+        result['error'] = error
+    return result
+
+
+@shared_task(
+    bind=True, max_retries=3, default_retry_delay=60,
+    acks_late=True, reject_on_worker_lost=True
+)
+def rotate_host_password_shard(self, run_id):
+    """
+    按轮换记录轮换一个主键范围内主机的密码，从记录的检查点开始
+    
+    分片异常时只重试本分片，重试从检查点继续；重试次数用尽后把记录标记为失败并返回
+    失败结果而不是抛出异常，保证汇总回调仍然执行。
+    worker退出时任务重新入队（acks_late），同一记录同一时间只由一个worker处理
+    """
+    run = PasswordRotationRun.objects.get(id=run_id)
+    with task_lock(
+        f'password_rotation_run:{run_id}', timeout=settings.PASSWORD_ROTATION_RUN_STALE_AFTER
+    ) as lock:
+        if not lock.acquired or run.status != 'running':
+            logger.warning(f"密码更新分片 {run.start_id}-{run.end_id} 已在处理或已结束，跳过")
+            return _rotation_run_result(run)
         
-        for city in cities:
-            data_centers = DataCenter.objects.filter(city=city)
-            
-            for data_center in data_centers:
-                # 统计该城市和机房的主机数量
-                total_hosts = Host.objects.filter(
-                    city=city,
-                    data_center=data_center
-                ).count()
-                
-                active_hosts = Host.objects.filter(
-                    city=city,
-                    data_center=data_center,
-                    status='active'
-                ).count()
-                
-                # 创建或更新统计记录
-                statistics, created = HostStatistics.objects.update_or_create(
-                    city=city,
-                    data_center=data_center,
-                    statistics_date=today,
-                    defaults={
-                        'host_count': total_hosts,
-                        'active_host_count': active_hosts
-                    }
+        try:
+            rotate_host_passwords(
+                chunk_size=settings.PASSWORD_ROTATION_CHUNK_SIZE,
+                run=run
+            )
+        except Exception as e:
+            if self.request.retries < self.max_retries:
+                logger.warning(
+                    f"密码更新分片 {run.start_id}-{run.end_id} 失败，"
+                    f"第 {self.request.retries + 1} 次重试: {str(e)}"
                 )
-                
-                logger.info(
-                    f"统计完成: {city.name}-{data_center.name} "
-                    f"总主机数: {total_hosts}, 运行中: {active_hosts}"
+                raise self.retry(exc=e)
+            logger.error(f"密码更新分片 {run.start_id}-{run.end_id} 重试后仍失败: {str(e)}")
+            # 重新读取，丢弃未提交批次在内存中的计数
+            run.refresh_from_db()
+            finish_rotation_run(run, status='failed', error={
+                'start_id': run.start_id,
+                'end_id': run.end_id,
+                'error': str(e),
+                'at': timezone.now().isoformat(),
+            })
+            result = _rotation_run_result(run, error=str(e))
+            result['failed'] = max(run.host_count - result['total'], result['failed'])
+            return result
+        
+        finish_rotation_run(run)
+    
+    logger.info(
+        f"密码更新分片 {run.start_id}-{run.end_id} 完成，共更新 {run.updated_count + run.created_count} 台主机"
+        f"（失败 {run.failed_count}）"
+    )
+    return _rotation_run_result(run)
+
+
+@shared_task
+def summarize_password_rotation(results):
+    """
+    汇总各分片的密码更新结果
+    
+    Args:
+        results: 各分片 rotate_host_password_shard 的返回值列表
+    """
+    summary = {
+        'shards': len(results),
+        'failed_shards': sum(1 for result in results if result.get('error')),
+        'total': sum(result['total'] for result in results),
+        'created': sum(result['created'] for result in results),
+        'failed': sum(result['failed'] for result in results),
+    }
+    if summary['failed']:
+        logger.error(
+            f"密码更新任务完成，共更新 {summary['total']} 台主机，"
+            f"失败 {summary['failed']} 台（{summary['failed_shards']}/{summary['shards']} 个分片失败）"
+        )
+    else:
+        logger.info(
+            f"密码更新任务完成，共 {summary['shards']} 个分片，更新 {summary['total']} 台主机"
+            f"（新建 {summary['created']}）"
+        )
+    return summary
+
+
+@shared_task
+def rotate_due_host_passwords_tick():
+    """
+    每隔 PASSWORD_ROTATION_TICK_INTERVAL 秒轮换到期主机的密码
+    
+    每台主机在上次修改密码 PASSWORD_ROTATION_INTERVAL 秒后到期，每次最多轮换
+    PASSWORD_ROTATION_MAX_PER_TICK 台（为None时按主机总数均分到整个周期），
+    避免所有主机在同一时刻集中修改密码
+    """
+    tick_interval = settings.PASSWORD_ROTATION_TICK_INTERVAL
+    with task_lock('rotate_due_host_passwords', timeout=tick_interval * 2) as lock:
+        if not lock.acquired:
+            logger.warning("上一轮到期密码轮换尚未结束，跳过本轮")
+            return "上一轮到期密码轮换尚未结束，跳过本轮"
+        
+        try:
+            limit = settings.PASSWORD_ROTATION_MAX_PER_TICK
+            if limit is None:
+                limit = get_due_rotation_limit(settings.PASSWORD_ROTATION_INTERVAL, tick_interval)
+            result = rotate_due_host_passwords(
+                interval=settings.PASSWORD_ROTATION_INTERVAL,
+                limit=limit,
+                chunk_size=settings.PASSWORD_ROTATION_CHUNK_SIZE
+            )
+        except Exception as e:
+            logger.error(f"到期密码轮换任务执行失败: {str(e)}")
+            raise
+        
+        if result['total'] or result['failed']:
+            logger.info(
+                f"到期密码轮换完成，共更新 {result['total']} 台主机（限额 {limit}，"
+                f"新建 {result['created']}，失败 {result['failed']}），耗时 {result['duration_ms']}ms"
+            )
+        return f"成功更新 {result['total']} 台到期主机的密码"
+
+
+@shared_task
+def reencrypt_host_passwords_task():
+    """
+    更换加密密钥后，把所有密码和密码历史重新加密为当前密钥（需要时手动触发）
+    
+    有未结束的密钥轮换记录时从其检查点续跑，否则新建一条记录
+    """
+    with task_lock('reencrypt_host_passwords', timeout=settings.KEY_ROTATION_LOCK_TIMEOUT) as lock:
+        if not lock.acquired:
+            logger.warning("密钥轮换正在执行，跳过本次")
+            return "密钥轮换正在执行，跳过本次"
+        
+        try:
+            run = KeyRotationRun.objects.filter(status='running').order_by('started_at').first()
+            if run is None:
+                run = KeyRotationRun.objects.create(
+                    total_count=HostPassword.objects.count() + HostPasswordHistory.objects.count()
                 )
+            else:
+                logger.info(f"从检查点续跑密钥轮换，已处理 {run.processed_count}/{run.total_count}")
+            run = reencrypt_host_passwords(run, chunk_size=settings.KEY_ROTATION_CHUNK_SIZE)
+        except Exception as e:
+            logger.error(f"密钥轮换任务执行失败: {str(e)}")
+            raise
         
-        logger.info(f"主机统计任务完成，统计日期: {today}")
+        logger.info(
+            f"密钥轮换完成，重新加密 {run.reencrypted_count} 条，"
+            f"跳过 {run.skipped_count} 条，失败 {run.failed_count} 条"
+        )
+        return f"成功重新加密 {run.reencrypted_count} 条密码记录"
+
+
+@shared_task
+def generate_host_statistics():
+    """
+    每天00:00按城市和机房维度统计主机数量和容量，并把统计数据写入数据库
+    
+    一次分组聚合加一次批量 upsert，查询数与机房数量无关
+    """
+    try:
+        today = date.today()
+        count = generate_statistics(today)
+        logger.info(f"主机统计任务完成，统计日期: {today}，共 {count} 个机房")
         return f"成功生成 {today} 的主机统计数据"
     except Exception as e:
         logger.error(f"主机统计任务执行失败: {str(e)}")
         raise
 
+
+@shared_task
+def backfill_host_statistics_chunk(date_from, date_to):
+    """
+    回填一段日期的主机统计（由 backfill_host_statistics 命令分发，日期为ISO格式字符串）
+
+    不更新周和月的汇总，全部分段结束后由 refresh_host_statistics_rollups 统一更新
+    """
+    date_from, date_to = date.fromisoformat(date_from), date.fromisoformat(date_to)
+    count = backfill_statistics(date_from, date_to, refresh=False)
+    logger.info(f"主机统计回填完成: {date_from} ~ {date_to}，写入 {count} 条统计记录")
+    return count
+
+
+@shared_task
+def refresh_host_statistics_rollups(results, date_from, date_to):
+    """回填结束后重新汇总所涉及的周和月（作为 chord 回调，results 为各分段写入的记录数）"""
+    date_from, date_to = date.fromisoformat(date_from), date.fromisoformat(date_to)
+    dates = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+    count = refresh_rollups(dates)
+    logger.info(
+        f"主机统计回填汇总完成: {date_from} ~ {date_to}，"
+        f"写入 {sum(results)} 条统计记录、{count} 条汇总记录"
+    )
+    return f"回填 {date_from} ~ {date_to} 的主机统计 {sum(results)} 条，汇总 {count} 条"
+
+
+@shared_task
+def reconcile_host_counters_task():
+    """
+    定时全量统计主机数量，修复实时计数的偏差（如绕过 ORM 直接修改数据库造成的不一致）
+    """
+    with task_lock('reconcile_host_counters', timeout=settings.HOST_COUNTER_RECONCILE_INTERVAL) as lock:
+        if not lock.acquired:
+            logger.warning("上一轮主机计数校对尚未结束，跳过本轮")
+            return "上一轮主机计数校对尚未结束，跳过本轮"
+        repaired = reconcile_host_counters()
+        if repaired:
+            logger.warning(f"主机计数校对完成，修复 {repaired} 条计数")
+        else:
+            logger.info("主机计数校对完成，没有偏差")
+        return f"修复 {repaired} 条主机计数"
+
+
+@shared_task
+def sweep_host_reachability():
+    """
+    定时巡检所有主机的可达性，结果批量写入探测记录表
+    
+    通过数据库任务锁保证同一时间只有一个巡检在执行（执行期间自动续期），上一轮未结束时本轮直接跳过
+    """
+    with task_lock('sweep_host_reachability', timeout=settings.HOST_SWEEP_INTERVAL * 2) as lock:
+        if not lock.acquired:
+            logger.warning("上一轮主机巡检尚未结束，跳过本轮")
+            return "上一轮主机巡检尚未结束，跳过本轮"
+        
+        try:
+            result = sweep_hosts(
+                chunk_size=settings.HOST_SWEEP_CHUNK_SIZE,
+                timeout=settings.HOST_SWEEP_TIMEOUT,
+                max_in_flight=settings.HOST_SWEEP_MAX_IN_FLIGHT
+            )
+        except Exception as e:
+            logger.error(f"主机巡检任务执行失败: {str(e)}")
+            raise
+        
+        logger.info(
+            f"主机巡检完成，共探测 {result['total']} 台主机，"
+            f"可达 {result['reachable']} 台，耗时 {result['duration_ms']}ms"
+        )
+        return f"成功巡检 {result['total']} 台主机"
+
+
+@shared_task
+def purge_expired_host_probes():
+    """
+    每天清理超过保留期的主机探测记录
+    """
+    try:
+        deleted = purge_host_probes(settings.HOST_PROBE_RETENTION_DAYS)
+        logger.info(f"探测记录清理完成，共删除 {deleted} 条")
+        return f"成功删除 {deleted} 条过期探测记录"
+    except Exception as e:
+        logger.error(f"探测记录清理任务执行失败: {str(e)}")
+        raise
+
+
+@shared_task
+def purge_expired_password_history():
+    """
+    每天分批清理超过保留期的密码历史
+    """
+    try:
+        deleted = purge_password_history(settings.PASSWORD_HISTORY_RETENTION_DAYS)
+        logger.info(f"密码历史清理完成，共删除 {deleted} 条")
+        return f"成功删除 {deleted} 条过期密码历史"
+    except Exception as e:
+        logger.error(f"密码历史清理任务执行失败: {str(e)}")
+        raise
+
+
+@shared_task
+def purge_expired_request_latency_rollups():
+    """
+    每天清理超过保留期的请求耗时汇总
+    """
+    try:
+        deleted = purge_latency_rollups(settings.REQUEST_METRICS_RETENTION_DAYS)
+        logger.info(f"请求耗时汇总清理完成，共删除 {deleted} 条")
+        return f"成功删除 {deleted} 条过期请求耗时汇总"
+    except Exception as e:
+        logger.error(f"请求耗时汇总清理任务执行失败: {str(e)}")
+        raise
@@ -0,0 +1,27 @@
+"""
+系统检查模块
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# 只在单个进程内生效的缓存后端
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    ping结果共享和单IP探测合并依赖多个worker共用的缓存，部署检查（check --deploy）时要求配置共享缓存
+    """
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS:
+        return []
+    return [
+        Warning(
+            '默认缓存只在单个进程内生效，ping结果和单IP探测合并无法在多个worker之间共享',
+            hint='多进程部署时设置环境变量 REDIS_CACHE_URL 使用 Redis 缓存',
+            id='host_management.W001',
+        )
+    ]
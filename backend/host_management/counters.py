@@ -0,0 +1,233 @@
+"""
+主机实时计数模块
+
+HostCounter 按（城市, 机房）保存当前的主机总数和运行中数量，随主机的增删改增量维护：
+- 单个主机的 save()/delete() 通过信号处理；
+- Host.objects 的 bulk_create、bulk_update、update、delete 按分组计算增量后一次性应用，
+  不逐条触发信号。
+计数用 F() 表达式原子增减；reconcile_host_counters 定期与全量统计比对并修复偏差。
+"""
+import contextvars
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from django.db import models, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from .models import Host, HostCounter
+
+logger = logging.getLogger(__name__)
+
+# 影响计数的主机字段
+COUNTED_FIELDS = ('status', 'city', 'city_id', 'data_center', 'data_center_id')
+
+# 为True时信号处理函数不更新计数（由批量操作统一处理）
+_suppressed = contextvars.ContextVar('host_counter_suppressed', default=False)
+
+
+@contextmanager
+def suppress_counter_signals():
+    """在上下文中跳过单条主机的计数信号处理"""
+    token = _suppressed.set(True)
+    try:
+        yield
+    finally:
+        _suppressed.reset(token)
+
+
+def group_counts(queryset):
+    """
+    按（城市, 机房）分组统计主机总数和运行中数量
+
+    Returns:
+        dict: {(city_id, data_center_id): [host_count, active_host_count]}
+    """
+    rows = (
+        queryset.order_by()
+        .values_list('city_id', 'data_center_id')
+        .annotate(host_count=Count('id'), active_host_count=Count('id', filter=Q(status='active')))
+    )
+    return {(city_id, data_center_id): [total, active] for city_id, data_center_id, total, active in rows}
+
+
+def group_counts_by_pk(pks, chunk_size=500):
+    """按主键分块统计（避免主键列表超出数据库参数个数限制），结果同 group_counts"""
+    counts = defaultdict(lambda: [0, 0])
+    for start in range(0, len(pks), chunk_size):
+        for key, (total, active) in group_counts(Host.objects.filter(pk__in=pks[start:start + chunk_size])).items():
+            counts[key][0] += total
+            counts[key][1] += active
+    return counts
+
+
+def _related_id(value):
+    return value.pk if isinstance(value, models.Model) else value
+
+
+def project_update_deltas(queryset, values):
+    """
+    在 queryset.update(**values) 执行前，根据更新前的分组计算更新后的增量
+
+    只能处理字面值；values 中的计数字段含表达式（如 F()）时返回 None，由调用方退回到前后两次统计。
+    """
+    values = {name: values[name] for name in COUNTED_FIELDS if name in values}
+    if any(hasattr(value, 'resolve_expression') for value in values.values()):
+        return None
+    city_id = _related_id(values.get('city', values.get('city_id')))
+    data_center_id = _related_id(values.get('data_center', values.get('data_center_id')))
+    updates_city = 'city' in values or 'city_id' in values
+    updates_data_center = 'data_center' in values or 'data_center_id' in values
+
+    deltas = defaultdict(lambda: [0, 0])
+    rows = queryset.order_by().values_list('city_id', 'data_center_id', 'status').annotate(count=Count('id'))
+    for old_city_id, old_data_center_id, old_status, count in rows:
+        new_key = (
+            city_id if updates_city else old_city_id,
+            data_center_id if updates_data_center else old_data_center_id,
+        )
+        new_status = values.get('status', old_status)
+        deltas[(old_city_id, old_data_center_id)][0] -= count
+        deltas[(old_city_id, old_data_center_id)][1] -= count if old_status == 'active' else 0
+        deltas[new_key][0] += count
+        deltas[new_key][1] += count if new_status == 'active' else 0
+    return deltas
+
+
+def diff_counts(before, after):
+    """计算两次分组统计之间的增量"""
+    deltas = defaultdict(lambda: [0, 0])
+    for key, (total, active) in after.items():
+        deltas[key][0] += total
+        deltas[key][1] += active
+    for key, (total, active) in before.items():
+        deltas[key][0] -= total
+        deltas[key][1] -= active
+    return deltas
+
+
+def apply_counter_deltas(deltas):
+    """
+    把增量原子地应用到计数表
+
+    Args:
+        deltas: {(city_id, data_center_id): [host_count增量, active_host_count增量]}
+    """
+    now = timezone.now()
+    for (city_id, data_center_id), (total, active) in deltas.items():
+        if not total and not active:
+            continue
+        counters = HostCounter.objects.filter(city_id=city_id, data_center_id=data_center_id)
+        changes = {
+            'host_count': F('host_count') + total,
+            'active_host_count': F('active_host_count') + active,
+            'updated_at': now,
+        }
+        if counters.update(**changes):
+            continue
+        if total < 0 or active < 0:
+            # 计数行已不存在（如机房被级联删除），没有可扣减的计数
+            continue
+        # 计数行不存在时先创建（并发创建时忽略冲突），再原子累加
+        HostCounter.objects.bulk_create(
+            [HostCounter(city_id=city_id, data_center_id=data_center_id)], ignore_conflicts=True
+        )
+        counters.update(**changes)
+
+
+def _host_key(city_id, data_center_id, status):
+    return (city_id, data_center_id), (1, 1 if status == 'active' else 0)
+
+
+def host_pre_save(sender, instance, raw=False, **kwargs):
+    """保存前读取主机原来的城市、机房和状态"""
+    instance._counter_previous = None
+    if raw or _suppressed.get() or instance._state.adding or instance.pk is None:
+        return
+    instance._counter_previous = (
+        Host.objects.filter(pk=instance.pk)
+        .values_list('city_id', 'data_center_id', 'status')
+        .first()
+    )
+
+
+def host_post_save(sender, instance, created, raw=False, **kwargs):
+    """主机新建、修改状态或迁移机房后更新计数"""
+    if raw or _suppressed.get():
+        return
+    deltas = defaultdict(lambda: [0, 0])
+    key, (total, active) = _host_key(instance.city_id, instance.data_center_id, instance.status)
+    deltas[key][0] += total
+    deltas[key][1] += active
+    previous = getattr(instance, '_counter_previous', None)
+    if not created and previous is not None:
+        key, (total, active) = _host_key(*previous)
+        deltas[key][0] -= total
+        deltas[key][1] -= active
+    apply_counter_deltas(deltas)
+
+
+def host_pre_delete(sender, instance, **kwargs):
+    """删除前读取主机在数据库中的城市、机房和状态（内存中的实例可能被修改后未保存）"""
+    instance._counter_previous = None
+    if _suppressed.get() or instance.pk is None:
+        return
+    instance._counter_previous = (
+        Host.objects.filter(pk=instance.pk)
+        .values_list('city_id', 'data_center_id', 'status')
+        .first()
+    )
+
+
+def host_post_delete(sender, instance, **kwargs):
+    """主机删除后按删除前读取的城市、机房和状态更新计数"""
+    previous = getattr(instance, '_counter_previous', None)
+    if _suppressed.get() or previous is None:
+        return
+    key, (total, active) = _host_key(*previous)
+    apply_counter_deltas({key: [-total, -active]})
+
+
+def reconcile_host_counters():
+    """
+    逐个（城市, 机房）统计主机数量并与计数表比对，修复有偏差的计数
+
+    每一行在一个事务中先 select_for_update 锁住计数行再统计主机，写入期间并发的 F() 增量
+    会等待行锁，不会被覆盖。
+
+    Returns:
+        int: 修复的计数行数
+    """
+    keys = set(Host.objects.order_by().values_list('city_id', 'data_center_id').distinct())
+    existing = set(HostCounter.objects.values_list('city_id', 'data_center_id'))
+    missing = keys - existing
+    if missing:
+        # 先按0补建缺失的计数行，再和其他行一样加锁校对
+        logger.warning(f"补建 {len(missing)} 条缺失的主机计数")
+        HostCounter.objects.bulk_create(
+            [HostCounter(city_id=city_id, data_center_id=data_center_id) for city_id, data_center_id in missing],
+            ignore_conflicts=True
+        )
+
+    repaired = 0
+    for city_id, data_center_id in keys | existing:
+        with transaction.atomic():
+            counter = (
+                HostCounter.objects.select_for_update()
+                .filter(city_id=city_id, data_center_id=data_center_id)
+                .first()
+            )
+            if counter is None:
+                continue
+            hosts = Host.objects.filter(city_id=city_id, data_center_id=data_center_id)
+            total, active = group_counts(hosts).get((city_id, data_center_id), (0, 0))
+            if counter.host_count == total and counter.active_host_count == active:
+                continue
+            logger.warning(
+                f"主机计数偏差: 城市 {city_id} 机房 {data_center_id} "
+                f"计数 {counter.host_count}/{counter.active_host_count}，实际 {total}/{active}"
+            )
+            HostCounter.objects.filter(pk=counter.pk).update(
+                host_count=total, active_host_count=active, updated_at=timezone.now()
+            )
+            repaired += 1
+    return repaired
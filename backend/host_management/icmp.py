@@ -0,0 +1,187 @@
+"""
+ICMP探测模块 - 进程内ping
+
+使用Linux非特权ICMP数据报套接字（SOCK_DGRAM + IPPROTO_ICMP）发送回显请求，
+一个套接字上同时复用多个探测，按标识符和序列号匹配回复，不再为每次探测fork一个ping进程。
+需要当前用户组在 net.ipv4.ping_group_range 范围内，否则创建套接字会被拒绝。
+"""
+import errno
+import itertools
+import os
+import select
+import socket
+import struct
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+
+_HEADER = struct.Struct('!BBHHH')
+_PAYLOAD = b'dj-interview-ping'
+_RECV_BUFFER_SIZE = 4 * 1024 * 1024
+
+
+def _checksum(data):
+    """计算ICMP校验和"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def _build_echo_request(identifier, sequence):
+    """构造ICMP回显请求报文"""
+    header = _HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    checksum = _checksum(header + _PAYLOAD)
+    return _HEADER.pack(ICMP_ECHO_REQUEST, 0, checksum, identifier, sequence) + _PAYLOAD
+
+
+def _open_socket():
+    """创建非特权ICMP数据报套接字"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, _RECV_BUFFER_SIZE)
+    except OSError:
+        pass
+    sock.setblocking(False)
+    sock.bind(('', 0))
+    return sock
+
+
+@lru_cache(maxsize=1)
+def is_available():
+    """
+    检查当前进程是否允许创建非特权ICMP套接字
+
+    Returns:
+        bool: 可用返回True
+    """
+    try:
+        sock = _open_socket()
+    except (OSError, AttributeError):
+        return False
+    sock.close()
+    return True
+
+
+class IcmpProber:
+    """
+    基于单个ICMP数据报套接字的并发探测器
+
+    同一时刻最多有 max_in_flight 个回显请求在途，每个请求独立计算超时。
+    """
+
+    def __init__(self, timeout=3, max_in_flight=1024):
+        self.timeout = timeout
+        self.max_in_flight = max(1, min(max_in_flight, 0xffff))
+        self._sequence = itertools.count(os.getpid() & 0xffff)
+
+    def iter_ping(self, ip_addresses):
+        """
+        探测多个IP，按回复到达顺序逐个产出结果
+
+        Args:
+            ip_addresses: IP地址列表（允许重复，每个元素单独探测）
+
+        Yields:
+            tuple: (ip_address, {'reachable': bool, 'response_time': float or None})
+        """
+        pending = iter(ip_addresses)
+        exhausted = False
+        # sequence -> (ip_address, 发送时间)，按发送顺序排列，便于从头部淘汰超时探测
+        in_flight = OrderedDict()
+
+        with _open_socket() as sock:
+            # Linux会把数据报ICMP套接字的标识符改写为本地端口号
+            identifier = sock.getsockname()[1] & 0xffff
+            while True:
+                # 补充在途探测
+                while not exhausted and len(in_flight) < self.max_in_flight:
+                    ip_address = next(pending, None)
+                    if ip_address is None:
+                        exhausted = True
+                        break
+                    sequence = next(self._sequence) & 0xffff
+                    while sequence in in_flight:
+                        sequence = next(self._sequence) & 0xffff
+                    packet = _build_echo_request(identifier, sequence)
+                    try:
+                        sock.sendto(packet, (ip_address, 0))
+                    except BlockingIOError:
+                        select.select([], [sock], [], self.timeout)
+                        try:
+                            sock.sendto(packet, (ip_address, 0))
+                        except OSError as e:
+                            yield ip_address, {'reachable': False, 'response_time': None, 'error': str(e)}
+                            continue
+                    except OSError as e:
+                        yield ip_address, {'reachable': False, 'response_time': None, 'error': str(e)}
+                        continue
+                    in_flight[sequence] = (ip_address, time.perf_counter())
+
+                if not in_flight:
+                    if exhausted:
+                        return
+                    continue
+
+                # 淘汰已超时的探测
+                now = time.perf_counter()
+                while in_flight:
+                    sequence, (ip_address, sent_at) = next(iter(in_flight.items()))
+                    if now - sent_at < self.timeout:
+                        break
+                    del in_flight[sequence]
+                    yield ip_address, {'reachable': False, 'response_time': None}
+                if not in_flight:
+                    continue
+
+                oldest_sent_at = next(iter(in_flight.values()))[1]
+                wait = max(0.0, oldest_sent_at + self.timeout - now)
+                readable, _, _ = select.select([sock], [], [], wait)
+                if not readable:
+                    continue
+
+                # 读取所有已到达的回复
+                while True:
+                    try:
+                        data, address = sock.recvfrom(1024)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except OSError as e:
+                        # ICMP错误（如目的不可达）会以套接字错误的形式上报，忽略后继续等待
+                        if e.errno in (errno.EHOSTUNREACH, errno.ENETUNREACH, errno.ECONNREFUSED):
+                            continue
+                        raise
+                    received_at = time.perf_counter()
+                    # macOS的数据报ICMP套接字会带上IP头
+                    if len(data) >= 20 and data[0] >> 4 == 4:
+                        data = data[(data[0] & 0x0f) * 4:]
+                    if len(data) < _HEADER.size:
+                        continue
+                    icmp_type, _, _, reply_identifier, sequence = _HEADER.unpack_from(data)
+                    if icmp_type != ICMP_ECHO_REPLY or reply_identifier != identifier:
+                        continue
+                    probe = in_flight.get(sequence)
+                    if probe is None or probe[0] != address[0]:
+                        continue
+                    del in_flight[sequence]
+                    ip_address, sent_at = probe
+                    yield ip_address, {
+                        'reachable': True,
+                        'response_time': round((received_at - sent_at) * 1000, 3)
+                    }
+
+    def ping(self, ip_address):
+        """
+        探测单个IP
+
+        Returns:
+            dict: {'reachable': bool, 'response_time': float or None}
+        """
+        for _, result in self.iter_ping([ip_address]):
+            return result
+        return {'reachable': False, 'response_time': None}
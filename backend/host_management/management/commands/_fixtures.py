@@ -0,0 +1,59 @@
+"""
+性能测试命令共用的测试数据
+
+create_bench_hosts 批量创建测试城市、机房和主机，delete_bench_hosts 删除它们；
+在事务中创建并回滚的命令不需要调用 delete_bench_hosts。
+"""
+import random
+from django.db import transaction
+from host_management.models import City, DataCenter, Host
+
+
+def create_bench_hosts(hosts, cities=1, data_centers=1, populated_ratio=1.0, statuses=None):
+    """
+    批量创建性能测试用的城市、机房和主机
+
+    主机按顺序轮流分配到有主机的机房，主机名为 bench-host-<序号>。
+
+    Args:
+        hosts: 主机数量
+        cities: 城市数量，机房按顺序轮流分配到城市
+        data_centers: 机房数量
+        populated_ratio: 有主机的机房比例（至少一个机房有主机）
+        statuses: 主机状态候选列表，逐台随机选择；为None时使用默认状态
+
+    Returns:
+        tuple: (城市列表, 机房列表, 按升序排列的主机主键列表)
+    """
+    with transaction.atomic():
+        city_objs = City.objects.bulk_create([
+            City(name=f'性能测试城市{i}', code=f'BENCH{i}') for i in range(cities)
+        ])
+        data_center_objs = DataCenter.objects.bulk_create([
+            DataCenter(name=f'性能测试机房{i}', code=f'BENCH-DC{i}', city=city_objs[i % len(city_objs)])
+            for i in range(data_centers)
+        ], batch_size=1000)
+        populated = data_center_objs[:max(1, int(len(data_center_objs) * populated_ratio))]
+        host_objs = []
+        for i in range(hosts):
+            data_center = populated[i % len(populated)]
+            host = Host(
+                hostname=f'bench-host-{i}',
+                ip_address=f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}',
+                city_id=data_center.city_id,
+                data_center=data_center
+            )
+            if statuses:
+                host.status = random.choice(statuses)
+            host_objs.append(host)
+        Host.objects.bulk_create(host_objs, batch_size=1000)
+    host_ids = list(Host.objects.filter(city__in=city_objs).order_by('id').values_list('id', flat=True))
+    return city_objs, data_center_objs, host_ids
+
+
+def delete_bench_hosts(cities):
+    """删除 create_bench_hosts 创建的城市及其机房、主机"""
+    with transaction.atomic():
+        # 先通过 Host.objects 删除主机，以便同步扣减 HostCounter
+        Host.objects.filter(city__in=cities).delete()
+        City.objects.filter(pk__in=[city.pk for city in cities]).delete()
@@ -0,0 +1,119 @@
+"""
+回填历史主机统计的管理命令
+使用方法: python manage.py backfill_host_statistics --from 2024-01-01 --to 2025-12-31 --workers 8
+
+日期范围按 --chunk-days 切分为多段，由进程池并行执行（--celery 时分发为Celery任务），
+每段对主机表做两次分组聚合后逐天批量 upsert，可重复执行；全部结束后统一更新周和月的汇总。
+某一天的统计按当时已创建的主机及其当前的城市、机房和状态计算。
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+import django
+from celery import chord
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from host_management.celery_tasks import backfill_host_statistics_chunk, refresh_host_statistics_rollups
+from host_management.statistics import backfill_statistics, refresh_rollups
+
+
+def _init_worker():
+    # 以 spawn/forkserver 方式启动的子进程需要重新初始化Django
+    django.setup()
+
+
+def _backfill_chunk(date_from, date_to, batch_size):
+    return date_from, date_to, backfill_statistics(date_from, date_to, batch_size=batch_size, refresh=False)
+
+
+class Command(BaseCommand):
+    help = '按日期范围回填主机统计（并行执行，可重复执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            type=date.fromisoformat,
+            required=True,
+            help='开始日期（YYYY-MM-DD）',
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            type=date.fromisoformat,
+            default=date.today(),
+            help='结束日期（YYYY-MM-DD，默认：今天）',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='并行进程数（默认：4，1表示在当前进程执行）',
+        )
+        parser.add_argument(
+            '--chunk-days',
+            type=int,
+            default=31,
+            help='每段的天数（默认：31）',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='每条 INSERT 语句写入的记录数（默认：1000）',
+        )
+        parser.add_argument(
+            '--celery',
+            action='store_true',
+            help='把各段分发为Celery任务，由worker并行执行',
+        )
+
+    def handle(self, *args, **options):
+        date_from, date_to = options['date_from'], options['date_to']
+        if date_from > date_to:
+            raise CommandError('开始日期不能晚于结束日期')
+        if options['chunk_days'] < 1 or options['workers'] < 1:
+            raise CommandError('--chunk-days 和 --workers 必须大于0')
+
+        chunks = []
+        start = date_from
+        while start <= date_to:
+            end = min(start + timedelta(days=options['chunk_days'] - 1), date_to)
+            chunks.append((start, end))
+            start = end + timedelta(days=1)
+
+        if options['celery']:
+            chord(
+                backfill_host_statistics_chunk.s(start.isoformat(), end.isoformat()) for start, end in chunks
+            )(refresh_host_statistics_rollups.s(date_from.isoformat(), date_to.isoformat()))
+            self.stdout.write(self.style.SUCCESS(
+                f'已分发 {len(chunks)} 个回填任务（{date_from} ~ {date_to}），全部结束后更新周和月的汇总'
+            ))
+            return
+
+        start_time = time.perf_counter()
+        written = 0
+        if options['workers'] == 1 or len(chunks) == 1:
+            for start, end in chunks:
+                written += backfill_statistics(start, end, batch_size=options['batch_size'], refresh=False)
+                self.stdout.write(f'  {start} ~ {end} 完成')
+        else:
+            # 子进程各自建立数据库连接，不能继承父进程的连接
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as executor:
+                futures = [
+                    executor.submit(_backfill_chunk, start, end, options['batch_size'])
+                    for start, end in chunks
+                ]
+                for future in as_completed(futures):
+                    start, end, count = future.result()
+                    written += count
+                    self.stdout.write(f'  {start} ~ {end} 完成，写入 {count} 条统计记录')
+
+        days = (date_to - date_from).days + 1
+        with transaction.atomic():
+            rollups = refresh_rollups([date_from + timedelta(days=i) for i in range(days)])
+        self.stdout.write(self.style.SUCCESS(
+            f'回填 {date_from} ~ {date_to} 共 {days} 天，写入 {written} 条统计记录、{rollups} 条汇总记录，'
+            f'耗时 {time.perf_counter() - start_time:.2f}s'
+        ))
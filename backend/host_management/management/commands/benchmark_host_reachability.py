@@ -0,0 +1,55 @@
+"""
+主机可达性字段批量更新性能测试命令
+使用方法: python manage.py benchmark_host_reachability --hosts 100000
+测试数据在事务中创建，测试结束后回滚，不会留在数据库中
+"""
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from host_management.reachability import update_host_reachability
+from ._fixtures import create_bench_hosts
+
+
+class Command(BaseCommand):
+    help = '测试批量更新主机可达性字段的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hosts',
+            type=int,
+            default=100000,
+            help='参与测试的主机数量（默认：100000）',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='每批更新的主机数（默认：1000）',
+        )
+
+    def handle(self, *args, **options):
+        hosts_count = options['hosts']
+
+        with transaction.atomic():
+            start_time = time.perf_counter()
+            _, _, host_ids = create_bench_hosts(hosts_count)
+            self.stdout.write(f'创建 {len(host_ids)} 台测试主机，耗时 {time.perf_counter() - start_time:.2f}s')
+
+            # 约80%的主机可达
+            results = [
+                (host_id, {'reachable': True, 'response_time': round(random.uniform(0.1, 50), 3)})
+                if random.random() < 0.8 else
+                (host_id, {'reachable': False, 'response_time': None})
+                for host_id in host_ids
+            ]
+
+            start_time = time.perf_counter()
+            updated = update_host_reachability(results, timezone.now(), chunk_size=options['chunk_size'])
+            elapsed = time.perf_counter() - start_time
+
+            self.stdout.write(self.style.SUCCESS(
+                f'更新 {updated} 台主机的可达性字段，耗时 {elapsed:.2f}s，{updated / elapsed:.0f} 台/秒'
+            ))
+            transaction.set_rollback(True)
@@ -0,0 +1,50 @@
+"""
+密码轮换性能测试命令
+使用方法: python manage.py benchmark_password_rotation --hosts 100000
+只轮换测试主机，测试结束后删除测试数据，不会留在数据库中
+"""
+import time
+from django.core.management.base import BaseCommand
+from host_management.passwords import rotate_host_passwords
+from ._fixtures import create_bench_hosts, delete_bench_hosts
+
+
+class Command(BaseCommand):
+    help = '测试批量轮换主机密码的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hosts',
+            type=int,
+            default=100000,
+            help='参与测试的主机数量（默认：100000）',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='每批轮换的主机数（默认：1000）',
+        )
+
+    def handle(self, *args, **options):
+        hosts_count = options['hosts']
+        
+        start_time = time.perf_counter()
+        cities, _, host_ids = create_bench_hosts(hosts_count)
+        self.stdout.write(f'创建 {len(host_ids)} 台测试主机，耗时 {time.perf_counter() - start_time:.2f}s')
+        
+        # 不在外层事务中运行，保持每批一个独立事务；只轮换测试主机
+        try:
+            # 第一轮为新建密码记录，第二轮为更新已有记录
+            for name in ('首次轮换', '再次轮换'):
+                result = rotate_host_passwords(
+                    chunk_size=options['chunk_size'], id_range=(host_ids[0], host_ids[-1])
+                )
+                elapsed = result['duration_ms'] / 1000
+                self.stdout.write(self.style.SUCCESS(
+                    f'{name}: 新建 {result["created"]}，更新 {result["updated"]}，'
+                    f'失败 {result["failed"]}，耗时 {elapsed:.2f}s，'
+                    f'{result["total"] / max(elapsed, 1e-6):.0f} 台/秒'
+                ))
+        finally:
+            delete_bench_hosts(cities)
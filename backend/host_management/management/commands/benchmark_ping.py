@@ -0,0 +1,76 @@
+"""
+ping探测性能测试命令
+使用方法: python manage.py benchmark_ping --count 1000
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from host_management import icmp
+from host_management.utils import ping_host_subprocess
+
+
+class Command(BaseCommand):
+    help = '对比ICMP套接字与ping命令两种探测方式的每秒探测数'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=1000,
+            help='每种方式的探测次数（默认：1000）',
+        )
+        parser.add_argument(
+            '--target',
+            default='127.0.0.1',
+            help='探测目标IP（默认：127.0.0.1）',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=64,
+            help='ping命令方式的并发进程数（默认：64）',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            default=1,
+            help='单次探测超时时间，秒（默认：1）',
+        )
+
+    def handle(self, *args, **options):
+        count = options['count']
+        target = options['target']
+        timeout = options['timeout']
+
+        self.stdout.write(self.style.SUCCESS(f'开始测试: 目标 {target}，每种方式 {count} 次探测'))
+
+        # ICMP套接字
+        if icmp.is_available():
+            prober = icmp.IcmpProber(timeout=timeout, max_in_flight=count)
+            start_time = time.perf_counter()
+            results = [result for _, result in prober.iter_ping([target] * count)]
+            self._report('ICMP套接字', results, time.perf_counter() - start_time)
+        else:
+            self.stdout.write(self.style.WARNING(
+                '  ICMP套接字不可用（检查 net.ipv4.ping_group_range），跳过'
+            ))
+
+        # ping命令
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            start_time = time.perf_counter()
+            results = list(executor.map(
+                lambda ip_address: ping_host_subprocess(ip_address, timeout=timeout),
+                [target] * count
+            ))
+            self._report('ping命令', results, time.perf_counter() - start_time)
+
+    def _report(self, name, results, elapsed):
+        """输出单种方式的测试结果"""
+        reachable = sum(1 for result in results if result['reachable'])
+        errors = {result['error'] for result in results if result.get('error')}
+        self.stdout.write(
+            f'  {name}: {len(results)} 次探测，可达 {reachable} 次，'
+            f'耗时 {elapsed:.3f}s，{len(results) / elapsed:.0f} 次/秒'
+        )
+        for error in errors:
+            self.stdout.write(self.style.WARNING(f'    错误: {error}'))
@@ -1,51 +1,113 @@
 """
 中间件模块 - 统计请求耗时
 """
+import logging
 import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
-from .models import RequestLog
+from .query_stats import QueryStats
+from .request_logs import get_sample_weight, save_request_log
+from .request_metrics import get_latency_histograms
+from .request_routes import resolve_route
+from .utils import get_client_ip
+
+logger = logging.getLogger(__name__)
 
 
 class RequestTimingMiddleware(MiddlewareMixin):
     """
     请求耗时统计中间件
-    记录每个请求的路径、方法、状态码、耗时等信息
+    记录每个请求的路径、路由模板、方法、状态码、耗时以及SQL查询次数和耗时等信息
+    所有请求都累加到耗时直方图；请求日志只采样写入（慢请求和5xx总是写入）
     """
     
     def process_request(self, request):
-        """请求开始时记录时间"""
-        request._start_time = time.time()
+        """请求开始时记录时间，并开始统计SQL"""
+        request._start_time = time.perf_counter()
+        request._query_stats = QueryStats()
+        request._query_wrapper = ExitStack()
+        request._query_wrapper.enter_context(connection.execute_wrapper(request._query_stats))
         return None
 
     def process_response(self, request, response):
         """请求结束时计算耗时并记录"""
         if hasattr(request, '_start_time'):
-            duration = (time.time() - request._start_time) * 1000  # 转换为毫秒
-            
-            # 获取客户端IP
-            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-            if x_forwarded_for:
-                ip_address = x_forwarded_for.split(',')[0]
-            else:
-                ip_address = request.META.get('REMOTE_ADDR')
-            
-            # 获取User Agent
-            user_agent = request.META.get('HTTP_USER_AGENT', '')[:500]
-            
-            # 记录请求日志（异步保存，避免影响响应时间）
-            try:
-                RequestLog.objects.create(
-                    path=request.path[:500],
-                    method=request.method,
-                    status_code=response.status_code,
-                    duration_ms=duration,
-                    ip_address=ip_address,
-                    user_agent=user_agent
+            request._query_wrapper.close()
+            if settings.REQUEST_SERVER_TIMING_HEADER:
+                response['Server-Timing'] = self._server_timing(request)
+            if response.streaming:
+                # 流式响应在内容全部发送完之后才算结束
+                response.streaming_content = self._wrap_streaming_content(
+                    request, response, response.streaming_content
                 )
-            except Exception as e:
-                # 记录日志失败不应该影响正常响应
-                # 在生产环境中应该使用日志系统记录错误
-                pass
+            else:
+                self._save_log(request, response)
         
         return response
 
+    def _wrap_streaming_content(self, request, response, content):
+        """包装流式响应内容，在内容发送完毕（或客户端断开）时记录日志"""
+        try:
+            # 生成内容时执行的查询也计入这个请求
+            with connection.execute_wrapper(request._query_stats):
+                yield from content
+        finally:
+            self._save_log(request, response)
+
+    @staticmethod
+    def _server_timing(request):
+        """生成 Server-Timing 响应头（流式响应只包含开始发送内容之前的部分）"""
+        stats = request._query_stats
+        total = (time.perf_counter() - request._start_time) * 1000
+        return f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries", total;dur={total:.2f}'
+
+    def _save_log(self, request, response):
+        """保存请求日志"""
+        duration = (time.perf_counter() - request._start_time) * 1000  # 转换为毫秒
+
+        # 按路由模板和视图名归类（/api/hosts/17/ping/ -> api/hosts/<pk>/ping/）
+        route, view_name = resolve_route(request)
+
+        # 累加耗时直方图（分位数从分钟汇总计算，不受采样影响）
+        try:
+            get_latency_histograms().record(route, view_name, request.method, response.status_code, duration)
+        except Exception:
+            logger.exception("记录请求耗时直方图失败")
+
+        # 采样决定是否写入请求日志
+        sample_weight = get_sample_weight(route, view_name, response.status_code, duration)
+        if sample_weight is None:
+            return
+        
+        query_stats = request._query_stats
+
+        # 获取客户端IP
+        ip_address = get_client_ip(request)
+        
+        # 获取User Agent
+        user_agent = request.META.get('HTTP_USER_AGENT', '')[:500]
+        
+        # 记录请求日志（放入后台写入队列，不在请求中访问数据库）
+        try:
+            save_request_log(
+                path=request.path[:500],
+                route=route,
+                view_name=view_name,
+                method=request.method,
+                status_code=response.status_code,
+                duration_ms=duration,
+                ip_address=ip_address,
+                user_agent=user_agent,
+                sample_weight=sample_weight,
+                query_count=query_stats.count,
+                sql_duration_ms=query_stats.duration * 1000,
+                slowest_query_ms=query_stats.slowest_duration * 1000 if query_stats.count else None,
+                slowest_query=query_stats.slowest_fingerprint[:1000],
+                created_at=timezone.now()
+            )
+        except Exception:
+            # 记录日志失败不应该影响正常响应
+            logger.exception("记录请求日志失败")
@@ -0,0 +1,59 @@
+# Generated by Django 6.0.1 on 2026-10-17 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HostProbe",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("probed_at", models.DateTimeField(verbose_name="探测时间")),
+                (
+                    "rtt_ms",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="响应时间(毫秒)"
+                    ),
+                ),
+                ("reachable", models.BooleanField(verbose_name="是否可达")),
+                (
+                    "host",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="probes",
+                        to="host_management.host",
+                        verbose_name="主机",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "主机探测记录",
+                "verbose_name_plural": "主机探测记录",
+                "ordering": ["-probed_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["host", "-probed_at"],
+                        name="host_manage_host_id_8ae297_idx",
+                    ),
+                    models.Index(
+                        fields=["probed_at"], name="host_manage_probed__e5ca1c_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-17 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0002_host_probe"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="host",
+            name="last_rtt_ms",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="最后响应时间(毫秒)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="host",
+            name="last_seen_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="最后可达时间"
+            ),
+        ),
+        migrations.AddField(
+            model_name="host",
+            name="reachable",
+            field=models.BooleanField(blank=True, null=True, verbose_name="是否可达"),
+        ),
+    ]
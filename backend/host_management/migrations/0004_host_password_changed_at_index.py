@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-17 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0003_host_reachability"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="hostpassword",
+            name="password_changed_at",
+            field=models.DateTimeField(
+                auto_now=True, db_index=True, verbose_name="密码修改时间"
+            ),
+        ),
+    ]
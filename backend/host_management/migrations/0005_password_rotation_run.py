@@ -0,0 +1,90 @@
+# Generated by Django 6.0.1 on 2026-10-17 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0004_host_password_changed_at_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PasswordRotationRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start_id", models.IntegerField(verbose_name="起始主机ID")),
+                ("end_id", models.IntegerField(verbose_name="结束主机ID")),
+                ("host_count", models.IntegerField(default=0, verbose_name="主机数量")),
+                (
+                    "last_host_id",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="最后处理的主机ID"
+                    ),
+                ),
+                (
+                    "created_count",
+                    models.IntegerField(default=0, verbose_name="新建数量"),
+                ),
+                (
+                    "updated_count",
+                    models.IntegerField(default=0, verbose_name="更新数量"),
+                ),
+                (
+                    "failed_count",
+                    models.IntegerField(default=0, verbose_name="失败数量"),
+                ),
+                (
+                    "errors",
+                    models.JSONField(blank=True, default=list, verbose_name="错误记录"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("running", "运行中"),
+                            ("completed", "已完成"),
+                            ("failed", "失败"),
+                        ],
+                        default="running",
+                        max_length=20,
+                        verbose_name="状态",
+                    ),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="开始时间"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="结束时间"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "密码轮换记录",
+                "verbose_name_plural": "密码轮换记录",
+                "ordering": ["-started_at", "start_id"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "updated_at"],
+                        name="host_manage_status_8b91a1_idx",
+                    )
+                ],
+            },
+        ),
+    ]
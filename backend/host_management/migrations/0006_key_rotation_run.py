@@ -0,0 +1,81 @@
+# Generated by Django 6.0.1 on 2026-10-17 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0005_password_rotation_run"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="KeyRotationRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "total_count",
+                    models.IntegerField(default=0, verbose_name="密码记录数量"),
+                ),
+                (
+                    "last_password_id",
+                    models.BigIntegerField(
+                        blank=True, null=True, verbose_name="最后处理的密码记录ID"
+                    ),
+                ),
+                (
+                    "reencrypted_count",
+                    models.IntegerField(default=0, verbose_name="重新加密数量"),
+                ),
+                (
+                    "skipped_count",
+                    models.IntegerField(default=0, verbose_name="已是当前密钥数量"),
+                ),
+                (
+                    "failed_count",
+                    models.IntegerField(default=0, verbose_name="失败数量"),
+                ),
+                (
+                    "errors",
+                    models.JSONField(blank=True, default=list, verbose_name="错误记录"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("running", "运行中"), ("completed", "已完成")],
+                        default="running",
+                        max_length=20,
+                        verbose_name="状态",
+                    ),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="开始时间"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="结束时间"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "密钥轮换记录",
+                "verbose_name_plural": "密钥轮换记录",
+                "ordering": ["-started_at"],
+            },
+        ),
+    ]
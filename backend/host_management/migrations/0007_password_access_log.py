@@ -0,0 +1,83 @@
+# Generated by Django 6.0.1 on 2026-10-17 17:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0006_key_rotation_run"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="hostpassword",
+            options={
+                "permissions": [("retrieve_password", "可以获取主机密码明文")],
+                "verbose_name": "主机密码",
+                "verbose_name_plural": "主机密码",
+            },
+        ),
+        migrations.CreateModel(
+            name="PasswordAccessLog",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("username", models.CharField(max_length=150, verbose_name="用户名")),
+                ("hostname", models.CharField(max_length=100, verbose_name="主机名")),
+                (
+                    "ip_address",
+                    models.GenericIPAddressField(
+                        blank=True, null=True, verbose_name="客户端IP"
+                    ),
+                ),
+                ("accessed_at", models.DateTimeField(verbose_name="获取时间")),
+                (
+                    "host",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="password_access_logs",
+                        to="host_management.host",
+                        verbose_name="主机",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="password_access_logs",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="用户",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "密码获取记录",
+                "verbose_name_plural": "密码获取记录",
+                "ordering": ["-accessed_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["-accessed_at"], name="host_manage_accesse_638218_idx"
+                    ),
+                    models.Index(
+                        fields=["host", "-accessed_at"],
+                        name="host_manage_host_id_ee478b_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
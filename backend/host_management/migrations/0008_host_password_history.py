@@ -0,0 +1,89 @@
+# Generated by Django 6.0.1 on 2026-10-17 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_password_history(apps, schema_editor):
+    """把现有密码作为每台主机的第一条密码历史"""
+    HostPassword = apps.get_model("host_management", "HostPassword")
+    HostPasswordHistory = apps.get_model("host_management", "HostPasswordHistory")
+    last_id = 0
+    while True:
+        rows = list(
+            HostPassword.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "host_id", "encrypted_password", "password_changed_at")[
+                :1000
+            ]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        HostPasswordHistory.objects.bulk_create(
+            [
+                HostPasswordHistory(
+                    host_id=host_id,
+                    encrypted_password=encrypted_password,
+                    changed_at=changed_at,
+                )
+                for _, host_id, encrypted_password, changed_at in rows
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0007_password_access_log"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="keyrotationrun",
+            name="last_history_id",
+            field=models.BigIntegerField(
+                blank=True, null=True, verbose_name="最后处理的密码历史ID"
+            ),
+        ),
+        migrations.CreateModel(
+            name="HostPasswordHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("encrypted_password", models.TextField(verbose_name="加密后的密码")),
+                ("changed_at", models.DateTimeField(verbose_name="密码修改时间")),
+                (
+                    "host",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="password_history",
+                        to="host_management.host",
+                        verbose_name="主机",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "主机密码历史",
+                "verbose_name_plural": "主机密码历史",
+                "ordering": ["-changed_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["host", "-changed_at"],
+                        name="host_manage_host_id_cb1189_idx",
+                    ),
+                    models.Index(
+                        fields=["changed_at"], name="host_manage_changed_6f4a80_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_password_history, migrations.RunPython.noop),
+    ]
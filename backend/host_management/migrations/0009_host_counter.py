@@ -0,0 +1,89 @@
+# Generated by Django 6.0.1 on 2026-10-17 19:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_host_counters(apps, schema_editor):
+    """按现有主机初始化实时计数"""
+    Host = apps.get_model("host_management", "Host")
+    HostCounter = apps.get_model("host_management", "HostCounter")
+    rows = (
+        Host.objects.order_by()
+        .values_list("city_id", "data_center_id")
+        .annotate(
+            host_count=Count("id"),
+            active_host_count=Count("id", filter=Q(status="active")),
+        )
+    )
+    HostCounter.objects.bulk_create(
+        [
+            HostCounter(
+                city_id=city_id,
+                data_center_id=data_center_id,
+                host_count=host_count,
+                active_host_count=active_host_count,
+            )
+            for city_id, data_center_id, host_count, active_host_count in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0008_host_password_history"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HostCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("host_count", models.IntegerField(default=0, verbose_name="主机数量")),
+                (
+                    "active_host_count",
+                    models.IntegerField(default=0, verbose_name="运行中主机数量"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "city",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="host_counters",
+                        to="host_management.city",
+                        verbose_name="城市",
+                    ),
+                ),
+                (
+                    "data_center",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="host_counters",
+                        to="host_management.datacenter",
+                        verbose_name="机房",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "主机计数",
+                "verbose_name_plural": "主机计数",
+                "ordering": ["city", "data_center"],
+                "unique_together": {("city", "data_center")},
+            },
+        ),
+        migrations.RunPython(fill_host_counters, migrations.RunPython.noop),
+    ]
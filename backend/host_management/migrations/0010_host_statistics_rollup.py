@@ -0,0 +1,145 @@
+# Generated by Django 6.0.1 on 2026-10-17 20:00
+
+import django.db.models.deletion
+from datetime import timedelta
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def _next_month(start):
+    return start.replace(
+        year=start.year + start.month // 12, month=start.month % 12 + 1
+    )
+
+
+def fill_statistics_rollups(apps, schema_editor):
+    """按现有的每日统计生成周汇总和月汇总"""
+    HostStatistics = apps.get_model("host_management", "HostStatistics")
+    HostStatisticsRollup = apps.get_model("host_management", "HostStatisticsRollup")
+    periods = set()
+    for day in (
+        HostStatistics.objects.order_by()
+        .values_list("statistics_date", flat=True)
+        .distinct()
+    ):
+        week = day - timedelta(days=day.weekday())
+        periods.add(("week", week, week + timedelta(days=7)))
+        month = day.replace(day=1)
+        periods.add(("month", month, _next_month(month)))
+    for granularity, start, end in sorted(periods):
+        rows = (
+            HostStatistics.objects.order_by()
+            .filter(statistics_date__gte=start, statistics_date__lt=end)
+            .values_list("city_id", "data_center_id")
+            .annotate(
+                day_count=Count("id"),
+                host_count_sum=Sum("host_count"),
+                active_host_count_sum=Sum("active_host_count"),
+            )
+        )
+        HostStatisticsRollup.objects.bulk_create(
+            [
+                HostStatisticsRollup(
+                    granularity=granularity,
+                    period_start=start,
+                    city_id=city_id,
+                    data_center_id=data_center_id,
+                    day_count=day_count,
+                    host_count_sum=host_count_sum,
+                    active_host_count_sum=active_host_count_sum,
+                )
+                for city_id, data_center_id, day_count, host_count_sum, active_host_count_sum in rows
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0009_host_counter"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HostStatisticsRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[("week", "周"), ("month", "月")],
+                        max_length=10,
+                        verbose_name="汇总粒度",
+                    ),
+                ),
+                ("period_start", models.DateField(verbose_name="周期开始日期")),
+                ("day_count", models.IntegerField(default=0, verbose_name="统计天数")),
+                (
+                    "host_count_sum",
+                    models.BigIntegerField(default=0, verbose_name="主机数量合计"),
+                ),
+                (
+                    "active_host_count_sum",
+                    models.BigIntegerField(
+                        default=0, verbose_name="运行中主机数量合计"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+            ],
+            options={
+                "verbose_name": "主机统计汇总",
+                "verbose_name_plural": "主机统计汇总",
+                "ordering": ["granularity", "-period_start", "city", "data_center"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="hoststatistics",
+            index=models.Index(
+                fields=["statistics_date"], name="host_manage_statist_243e8e_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="hoststatisticsrollup",
+            name="city",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="statistics_rollups",
+                to="host_management.city",
+                verbose_name="城市",
+            ),
+        ),
+        migrations.AddField(
+            model_name="hoststatisticsrollup",
+            name="data_center",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="statistics_rollups",
+                to="host_management.datacenter",
+                verbose_name="机房",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="hoststatisticsrollup",
+            index=models.Index(
+                fields=["granularity", "period_start"],
+                name="host_manage_granula_d1ba96_idx",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="hoststatisticsrollup",
+            unique_together={("granularity", "city", "data_center", "period_start")},
+        ),
+        migrations.RunPython(fill_statistics_rollups, migrations.RunPython.noop),
+    ]
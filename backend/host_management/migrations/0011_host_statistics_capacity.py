@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0010_host_statistics_rollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="hoststatistics",
+            name="cpu_cores",
+            field=models.BigIntegerField(default=0, verbose_name="CPU核心数合计"),
+        ),
+        migrations.AddField(
+            model_name="hoststatistics",
+            name="disk_gb",
+            field=models.BigIntegerField(default=0, verbose_name="磁盘合计(GB)"),
+        ),
+        migrations.AddField(
+            model_name="hoststatistics",
+            name="memory_gb",
+            field=models.BigIntegerField(default=0, verbose_name="内存合计(GB)"),
+        ),
+        migrations.AddField(
+            model_name="hoststatistics",
+            name="os_counts",
+            field=models.JSONField(default=dict, verbose_name="按操作系统的主机数量"),
+        ),
+        migrations.AddField(
+            model_name="hoststatistics",
+            name="status_counts",
+            field=models.JSONField(default=dict, verbose_name="按状态的主机数量"),
+        ),
+    ]
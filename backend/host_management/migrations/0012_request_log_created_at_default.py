@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-17 22:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0011_host_statistics_capacity"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="requestlog",
+            name="created_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, verbose_name="创建时间"
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0012_request_log_created_at_default"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestLatencyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("minute", models.DateTimeField(verbose_name="分钟")),
+                ("route", models.CharField(max_length=500, verbose_name="路由")),
+                ("method", models.CharField(max_length=10, verbose_name="请求方法")),
+                (
+                    "status_class",
+                    models.PositiveSmallIntegerField(verbose_name="状态码类别"),
+                ),
+                ("count", models.IntegerField(verbose_name="请求次数")),
+                ("duration_sum_ms", models.FloatField(verbose_name="耗时合计(毫秒)")),
+                ("duration_max_ms", models.FloatField(verbose_name="最大耗时(毫秒)")),
+                ("buckets", models.JSONField(verbose_name="耗时分布")),
+            ],
+            options={
+                "verbose_name": "请求耗时汇总",
+                "verbose_name_plural": "请求耗时汇总",
+                "ordering": ["-minute"],
+                "indexes": [
+                    models.Index(
+                        fields=["minute"], name="host_manage_minute_eb4ff6_idx"
+                    ),
+                    models.Index(
+                        fields=["route", "method", "minute"],
+                        name="host_manage_route_daa8cb_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,174 @@
+# Generated by Django 6.0.1 on 2026-10-18 00:00
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+_GROUP_START = re.compile(r"\(\?P<(\w+)>")
+_CONVERTER = re.compile(r"<\w+:(\w+)>")
+
+
+def normalize_route(route):
+    """resolver_match.route 转换为路由模板（迁移时的规则，不随 request_routes 变化）"""
+    parts = []
+    position = 0
+    while True:
+        match = _GROUP_START.search(route, position)
+        if match is None:
+            parts.append(route[position:])
+            break
+        parts.append(route[position : match.start()])
+        parts.append(f"<{match.group(1)}>")
+        depth = 1
+        index = match.end()
+        while index < len(route) and depth:
+            char = route[index]
+            if char == "\\":
+                index += 1
+            elif char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+            index += 1
+        position = index
+    template = "".join(parts).replace("^", "").replace("\\.", ".")
+    if template.endswith("$"):
+        template = template[:-1]
+    if template.endswith("/?"):
+        template = template[:-2]
+    return _CONVERTER.sub(r"<\1>", template)
+
+
+def intern_rollup_routes(apps, schema_editor):
+    """把耗时汇总中保存的路由文本转换为路由模板并引用 RequestRoute"""
+    RequestRoute = apps.get_model("host_management", "RequestRoute")
+    RequestLatencyRollup = apps.get_model("host_management", "RequestLatencyRollup")
+    for route_text in (
+        RequestLatencyRollup.objects.order_by()
+        .values_list("route_text", flat=True)
+        .distinct()
+    ):
+        route, _ = RequestRoute.objects.get_or_create(
+            route=normalize_route(route_text)[:500], view_name=""
+        )
+        RequestLatencyRollup.objects.filter(route_text=route_text).update(route=route)
+
+
+def restore_rollup_route_text(apps, schema_editor):
+    RequestLatencyRollup = apps.get_model("host_management", "RequestLatencyRollup")
+    for rollup in RequestLatencyRollup.objects.select_related("route"):
+        rollup.route_text = rollup.route.route
+        rollup.save(update_fields=["route_text"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0013_request_latency_rollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestRoute",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("route", models.CharField(max_length=500, verbose_name="路由模板")),
+                (
+                    "view_name",
+                    models.CharField(
+                        blank=True, default="", max_length=200, verbose_name="视图名"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="创建时间"),
+                ),
+            ],
+            options={
+                "verbose_name": "请求路由",
+                "verbose_name_plural": "请求路由",
+                "ordering": ["route"],
+                "unique_together": {("route", "view_name")},
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name="requestlog",
+            name="host_manage_path_9a147e_idx",
+        ),
+        migrations.AddField(
+            model_name="requestlog",
+            name="route",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="request_logs",
+                to="host_management.requestroute",
+                verbose_name="路由",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="requestlog",
+            index=models.Index(
+                fields=["route", "method"], name="host_manage_route_i_3f95e7_idx"
+            ),
+        ),
+        # 耗时汇总的路由从文本改为外键：先保留原文本，转换后删除
+        migrations.RemoveIndex(
+            model_name="requestlatencyrollup",
+            name="host_manage_route_daa8cb_idx",
+        ),
+        migrations.RenameField(
+            model_name="requestlatencyrollup",
+            old_name="route",
+            new_name="route_text",
+        ),
+        migrations.AddField(
+            model_name="requestlatencyrollup",
+            name="route",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="latency_rollups",
+                to="host_management.requestroute",
+                verbose_name="路由",
+            ),
+        ),
+        migrations.RunPython(intern_rollup_routes, restore_rollup_route_text),
+        # 带默认值以便回滚时重新添加该列
+        migrations.AlterField(
+            model_name="requestlatencyrollup",
+            name="route_text",
+            field=models.CharField(default="", max_length=500, verbose_name="路由"),
+        ),
+        migrations.RemoveField(
+            model_name="requestlatencyrollup",
+            name="route_text",
+        ),
+        migrations.AlterField(
+            model_name="requestlatencyrollup",
+            name="route",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="latency_rollups",
+                to="host_management.requestroute",
+                verbose_name="路由",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="requestlatencyrollup",
+            index=models.Index(
+                fields=["route", "method", "minute"],
+                name="host_manage_route_i_3233eb_idx",
+            ),
+        ),
+    ]
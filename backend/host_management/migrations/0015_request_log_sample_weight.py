@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0014_request_route"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="requestlog",
+            name="sample_weight",
+            field=models.FloatField(default=1.0, verbose_name="采样权重"),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0015_request_log_sample_weight"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="requestlog",
+            name="query_count",
+            field=models.IntegerField(default=0, verbose_name="查询次数"),
+        ),
+        migrations.AddField(
+            model_name="requestlog",
+            name="slowest_query",
+            field=models.CharField(
+                blank=True, default="", max_length=1000, verbose_name="最慢查询指纹"
+            ),
+        ),
+        migrations.AddField(
+            model_name="requestlog",
+            name="slowest_query_ms",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="最慢查询耗时(毫秒)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="requestlog",
+            name="sql_duration_ms",
+            field=models.FloatField(default=0, verbose_name="SQL耗时(毫秒)"),
+        ),
+    ]
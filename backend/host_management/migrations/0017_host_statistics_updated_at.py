@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-18 03:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0016_request_log_query_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="hoststatistics",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name="更新时间",
+            ),
+            preserve_default=False,
+        ),
+    ]
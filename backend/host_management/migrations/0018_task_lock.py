@@ -0,0 +1,55 @@
+# Generated by Django 6.0.1 on 2026-10-18 04:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("host_management", "0017_host_statistics_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskLock",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=200, unique=True, verbose_name="锁名称"
+                    ),
+                ),
+                (
+                    "token",
+                    models.CharField(
+                        blank=True, default="", max_length=32, verbose_name="持有者令牌"
+                    ),
+                ),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="租约到期时间"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+            ],
+            options={
+                "verbose_name": "任务锁",
+                "verbose_name_plural": "任务锁",
+                "ordering": ["name"],
+            },
+        ),
+    ]
@@ -1,14 +1,17 @@
 """
 主机管理系统模型
 """
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.validators import validate_ipv4_address
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
 from django.conf import settings
 import base64
 import os
 
+# 进程内缓存的密钥环，由 HostPassword.get_cipher 首次调用时构建
+_cipher = None
+
 
 class City(models.Model):
     """城市模型"""
@@ -47,6 +50,69 @@ class DataCenter(models.Model):
         return f"{self.city.name}-{self.name}"
 
 
+class HostQuerySet(models.QuerySet):
+    """
+    主机查询集
+
+    批量操作（bulk_create、update、delete）不触发逐条信号，
+    这里按（城市, 机房）分组计算数量变化并更新 HostCounter。
+    bulk_update 内部按批调用 update，不需要单独处理。
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .counters import apply_counter_deltas, diff_counts, group_counts
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+                # 冲突的行不会新建（或被更新），主键也不一定回填，按主机名统计前后差异
+                hosts = self.model.objects.filter(hostname__in=[obj.hostname for obj in objs])
+                before = group_counts(hosts)
+                created = super().bulk_create(objs, *args, **kwargs)
+                apply_counter_deltas(diff_counts(before, group_counts(hosts)))
+            else:
+                created = super().bulk_create(objs, *args, **kwargs)
+                after = {}
+                for obj in created:
+                    counts = after.setdefault((obj.city_id, obj.data_center_id), [0, 0])
+                    counts[0] += 1
+                    counts[1] += obj.status == 'active'
+                apply_counter_deltas(after)
+        return created
+
+    def update(self, **kwargs):
+        from .counters import (
+            COUNTED_FIELDS, apply_counter_deltas, diff_counts, group_counts_by_pk, project_update_deltas
+        )
+        if not set(kwargs) & set(COUNTED_FIELDS):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            deltas = project_update_deltas(self, kwargs)
+            if deltas is not None:
+                updated = super().update(**kwargs)
+            else:
+                # 更新值是表达式时无法预先推算，先固定受影响的主键，更新后重新统计
+                pks = list(self.values_list('pk', flat=True))
+                before = group_counts_by_pk(pks)
+                updated = super().update(**kwargs)
+                deltas = diff_counts(before, group_counts_by_pk(pks))
+            apply_counter_deltas(deltas)
+        return updated
+
+    update.alters_data = True
+
+    def delete(self):
+        from .counters import apply_counter_deltas, diff_counts, group_counts, suppress_counter_signals
+        with transaction.atomic(using=self.db):
+            before = group_counts(self)
+            with suppress_counter_signals():
+                deleted = super().delete()
+            apply_counter_deltas(diff_counts(before, {}))
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Host(models.Model):
     """主机模型"""
     STATUS_CHOICES = [
@@ -65,9 +131,15 @@ class Host(models.Model):
     memory_gb = models.IntegerField(default=0, verbose_name="内存(GB)")
     disk_gb = models.IntegerField(default=0, verbose_name="磁盘(GB)")
     description = models.TextField(blank=True, null=True, verbose_name="描述")
+    # 可达性（由巡检批量更新，不修改 updated_at）
+    reachable = models.BooleanField(blank=True, null=True, verbose_name="是否可达")
+    last_seen_at = models.DateTimeField(blank=True, null=True, verbose_name="最后可达时间")
+    last_rtt_ms = models.FloatField(blank=True, null=True, verbose_name="最后响应时间(毫秒)")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
 
+    objects = HostQuerySet.as_manager()
+
     class Meta:
         verbose_name = "主机"
         verbose_name_plural = "主机"
@@ -77,16 +149,39 @@ class Host(models.Model):
         return f"{self.hostname} ({self.ip_address})"
 
 
+class HostProbe(models.Model):
+    """主机探测记录模型（只追加，由定时巡检批量写入）"""
+    host = models.ForeignKey(Host, on_delete=models.CASCADE, related_name='probes', verbose_name="主机")
+    probed_at = models.DateTimeField(verbose_name="探测时间")
+    rtt_ms = models.FloatField(blank=True, null=True, verbose_name="响应时间(毫秒)")
+    reachable = models.BooleanField(verbose_name="是否可达")
+
+    class Meta:
+        verbose_name = "主机探测记录"
+        verbose_name_plural = "主机探测记录"
+        ordering = ['-probed_at']
+        indexes = [
+            models.Index(fields=['host', '-probed_at']),
+            models.Index(fields=['probed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.host_id} {'可达' if self.reachable else '不可达'} ({self.probed_at})"
+
+
 class HostPassword(models.Model):
     """主机密码记录模型（加密存储）"""
     host = models.OneToOneField(Host, on_delete=models.CASCADE, related_name='password_record', verbose_name="主机")
     encrypted_password = models.TextField(verbose_name="加密后的密码")
-    password_changed_at = models.DateTimeField(auto_now=True, verbose_name="密码修改时间")
+    password_changed_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="密码修改时间")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
 
     class Meta:
         verbose_name = "主机密码"
         verbose_name_plural = "主机密码"
+        permissions = [
+            ('retrieve_password', '可以获取主机密码明文'),
+        ]
 
     def __str__(self):
         return f"{self.host.hostname} 密码记录"
@@ -115,58 +210,335 @@ class HostPassword(models.Model):
             key = key.encode()
         return key
 
+    @staticmethod
+    def get_retired_encryption_keys():
+        """获取已退役的加密密钥（只用于解密和重新加密旧密码）"""
+        keys = getattr(settings, 'ENCRYPTION_RETIRED_KEYS', None) or []
+        return [key.encode() if isinstance(key, str) else key for key in keys]
+
+    @classmethod
+    def get_cipher(cls):
+        """
+        获取密钥环（MultiFernet）
+        
+        用当前密钥加密，当前密钥和已退役密钥都可以解密；进程内只构建一次，
+        修改密钥配置后需要重启进程或调用 reset_cipher
+        """
+        global _cipher
+        if _cipher is None:
+            keys = [cls.get_encryption_key()] + cls.get_retired_encryption_keys()
+            _cipher = MultiFernet([Fernet(key) for key in keys])
+        return _cipher
+
+    @classmethod
+    def get_current_cipher(cls):
+        """获取只包含当前密钥的Fernet对象（用于判断密码是否已用当前密钥加密）"""
+        return Fernet(cls.get_encryption_key())
+
+    @staticmethod
+    def reset_cipher():
+        """丢弃进程内缓存的密钥环"""
+        global _cipher
+        _cipher = None
+
     def encrypt_password(self, password):
         """加密密码"""
-        key = self.get_encryption_key()
-        f = Fernet(key)
+        f = self.get_cipher()
         encrypted = f.encrypt(password.encode())
         return encrypted.decode()
 
     def decrypt_password(self):
         """解密密码"""
-        key = self.get_encryption_key()
-        f = Fernet(key)
+        f = self.get_cipher()
         decrypted = f.decrypt(self.encrypted_password.encode())
         return decrypted.decode()
 
     def set_password(self, password):
-        """设置密码（自动加密）"""
+        """设置密码（自动加密，并追加一条密码历史）"""
         self.encrypted_password = self.encrypt_password(password)
-        self.save()
+        with transaction.atomic():
+            self.save()
+            HostPasswordHistory.objects.create(
+                host_id=self.host_id,
+                encrypted_password=self.encrypted_password,
+                changed_at=self.password_changed_at
+            )
 
     def get_password(self):
         """获取密码（自动解密）"""
         return self.decrypt_password()
 
 
+class HostPasswordHistory(models.Model):
+    """主机密码历史模型（只追加，与密码轮换在同一批次写入，按保留天数分批清理）"""
+    host = models.ForeignKey(Host, on_delete=models.CASCADE, related_name='password_history', verbose_name="主机")
+    encrypted_password = models.TextField(verbose_name="加密后的密码")
+    changed_at = models.DateTimeField(verbose_name="密码修改时间")
+
+    class Meta:
+        verbose_name = "主机密码历史"
+        verbose_name_plural = "主机密码历史"
+        ordering = ['-changed_at']
+        indexes = [
+            models.Index(fields=['host', '-changed_at']),
+            models.Index(fields=['changed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.host_id} 密码历史 ({self.changed_at})"
+
+
+class PasswordAccessLog(models.Model):
+    """主机密码明文获取审计记录（只追加，批量写入）"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True,
+        related_name='password_access_logs', verbose_name="用户"
+    )
+    username = models.CharField(max_length=150, verbose_name="用户名")
+    host = models.ForeignKey(
+        Host, on_delete=models.SET_NULL, blank=True, null=True,
+        related_name='password_access_logs', verbose_name="主机"
+    )
+    hostname = models.CharField(max_length=100, verbose_name="主机名")
+    ip_address = models.GenericIPAddressField(blank=True, null=True, verbose_name="客户端IP")
+    accessed_at = models.DateTimeField(verbose_name="获取时间")
+
+    class Meta:
+        verbose_name = "密码获取记录"
+        verbose_name_plural = "密码获取记录"
+        ordering = ['-accessed_at']
+        indexes = [
+            models.Index(fields=['-accessed_at']),
+            models.Index(fields=['host', '-accessed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.username} 获取 {self.hostname} 密码 ({self.accessed_at})"
+
+
+class PasswordRotationRun(models.Model):
+    """密码全量轮换运行记录（每个分片一条，按检查点记录进度，中断后从检查点续跑）"""
+    STATUS_CHOICES = [
+        ('running', '运行中'),
+        ('completed', '已完成'),
+        ('failed', '失败'),
+    ]
+    # errors 中最多保留的错误条数
+    MAX_ERRORS = 100
+
+    start_id = models.IntegerField(verbose_name="起始主机ID")
+    end_id = models.IntegerField(verbose_name="结束主机ID")
+    host_count = models.IntegerField(default=0, verbose_name="主机数量")
+    last_host_id = models.IntegerField(blank=True, null=True, verbose_name="最后处理的主机ID")
+    created_count = models.IntegerField(default=0, verbose_name="新建数量")
+    updated_count = models.IntegerField(default=0, verbose_name="更新数量")
+    failed_count = models.IntegerField(default=0, verbose_name="失败数量")
+    errors = models.JSONField(default=list, blank=True, verbose_name="错误记录")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running', verbose_name="状态")
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name="开始时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="结束时间")
+
+    class Meta:
+        verbose_name = "密码轮换记录"
+        verbose_name_plural = "密码轮换记录"
+        ordering = ['-started_at', 'start_id']
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"密码轮换 {self.start_id}-{self.end_id} ({self.get_status_display()})"
+
+    @property
+    def processed_count(self):
+        """已处理的主机数"""
+        return self.created_count + self.updated_count + self.failed_count
+
+    @property
+    def progress(self):
+        """处理进度（0~1）"""
+        if self.status == 'completed' or not self.host_count:
+            return 1.0 if self.status == 'completed' else 0.0
+        return min(self.processed_count / self.host_count, 1.0)
+
+
+class KeyRotationRun(models.Model):
+    """密钥轮换记录（把密码重新加密为当前密钥，按检查点记录进度，中断后从检查点续跑）"""
+    STATUS_CHOICES = [
+        ('running', '运行中'),
+        ('completed', '已完成'),
+    ]
+    # errors 中最多保留的错误条数
+    MAX_ERRORS = 100
+
+    total_count = models.IntegerField(default=0, verbose_name="密码记录数量")
+    last_password_id = models.BigIntegerField(blank=True, null=True, verbose_name="最后处理的密码记录ID")
+    last_history_id = models.BigIntegerField(blank=True, null=True, verbose_name="最后处理的密码历史ID")
+    reencrypted_count = models.IntegerField(default=0, verbose_name="重新加密数量")
+    skipped_count = models.IntegerField(default=0, verbose_name="已是当前密钥数量")
+    failed_count = models.IntegerField(default=0, verbose_name="失败数量")
+    errors = models.JSONField(default=list, blank=True, verbose_name="错误记录")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running', verbose_name="状态")
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name="开始时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="结束时间")
+
+    class Meta:
+        verbose_name = "密钥轮换记录"
+        verbose_name_plural = "密钥轮换记录"
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"密钥轮换 {self.started_at} ({self.get_status_display()})"
+
+    @property
+    def processed_count(self):
+        """已处理的密码记录数"""
+        return self.reencrypted_count + self.skipped_count + self.failed_count
+
+    @property
+    def progress(self):
+        """处理进度（0~1）"""
+        if self.status == 'completed':
+            return 1.0
+        if not self.total_count:
+            return 0.0
+        return min(self.processed_count / self.total_count, 1.0)
+
+
+class TaskLock(models.Model):
+    """定时任务互斥锁（租约），见 utils.task_lock"""
+    name = models.CharField(max_length=200, unique=True, verbose_name="锁名称")
+    token = models.CharField(max_length=32, blank=True, default='', verbose_name="持有者令牌")  # 为空表示未持有
+    expires_at = models.DateTimeField(default=timezone.now, verbose_name="租约到期时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "任务锁"
+        verbose_name_plural = "任务锁"
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({'持有中' if self.token else '空闲'})"
+
+
+class HostCounter(models.Model):
+    """主机实时计数模型（按城市和机房维度，随主机增删改增量维护）"""
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='host_counters', verbose_name="城市")
+    data_center = models.ForeignKey(DataCenter, on_delete=models.CASCADE, related_name='host_counters', verbose_name="机房")
+    host_count = models.IntegerField(default=0, verbose_name="主机数量")
+    active_host_count = models.IntegerField(default=0, verbose_name="运行中主机数量")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "主机计数"
+        verbose_name_plural = "主机计数"
+        ordering = ['city', 'data_center']
+        unique_together = [['city', 'data_center']]
+
+    def __str__(self):
+        return f"{self.city_id}-{self.data_center_id}: {self.host_count}台（运行中 {self.active_host_count}台）"
+
+
 class HostStatistics(models.Model):
     """主机统计模型（按城市和机房维度）"""
     city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='statistics', verbose_name="城市")
     data_center = models.ForeignKey(DataCenter, on_delete=models.CASCADE, related_name='statistics', verbose_name="机房")
     host_count = models.IntegerField(default=0, verbose_name="主机数量")
     active_host_count = models.IntegerField(default=0, verbose_name="运行中主机数量")
+    # 容量合计与分布（与数量在同一次分组聚合中统计）
+    cpu_cores = models.BigIntegerField(default=0, verbose_name="CPU核心数合计")
+    memory_gb = models.BigIntegerField(default=0, verbose_name="内存合计(GB)")
+    disk_gb = models.BigIntegerField(default=0, verbose_name="磁盘合计(GB)")
+    status_counts = models.JSONField(default=dict, verbose_name="按状态的主机数量")
+    os_counts = models.JSONField(default=dict, verbose_name="按操作系统的主机数量")
     statistics_date = models.DateField(verbose_name="统计日期")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    # 每次生成或回填时更新，统计接口的 ETag 由它计算
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
 
     class Meta:
         verbose_name = "主机统计"
         verbose_name_plural = "主机统计"
         ordering = ['-statistics_date', 'city', 'data_center']
         unique_together = [['city', 'data_center', 'statistics_date']]
+        indexes = [
+            models.Index(fields=['statistics_date']),
+        ]
 
     def __str__(self):
         return f"{self.city.name}-{self.data_center.name} ({self.statistics_date}): {self.host_count}台"
 
 
+class HostStatisticsRollup(models.Model):
+    """主机统计汇总模型（按周、按月汇总每日统计，写入每日统计时增量更新）"""
+    GRANULARITY_CHOICES = [
+        ('week', '周'),
+        ('month', '月'),
+    ]
+
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES, verbose_name="汇总粒度")
+    period_start = models.DateField(verbose_name="周期开始日期")
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='statistics_rollups', verbose_name="城市")
+    data_center = models.ForeignKey(
+        DataCenter, on_delete=models.CASCADE, related_name='statistics_rollups', verbose_name="机房"
+    )
+    day_count = models.IntegerField(default=0, verbose_name="统计天数")
+    host_count_sum = models.BigIntegerField(default=0, verbose_name="主机数量合计")
+    active_host_count_sum = models.BigIntegerField(default=0, verbose_name="运行中主机数量合计")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "主机统计汇总"
+        verbose_name_plural = "主机统计汇总"
+        ordering = ['granularity', '-period_start', 'city', 'data_center']
+        unique_together = [['granularity', 'city', 'data_center', 'period_start']]
+        indexes = [
+            models.Index(fields=['granularity', 'period_start']),
+        ]
+
+    def __str__(self):
+        return f"{self.city_id}-{self.data_center_id} ({self.get_granularity_display()} {self.period_start})"
+
+
+class RequestRoute(models.Model):
+    """请求路由模型（路由模板和视图名，由请求日志和耗时汇总按主键引用）"""
+    route = models.CharField(max_length=500, verbose_name="路由模板")  # 如 api/hosts/<pk>/ping/
+    view_name = models.CharField(max_length=200, blank=True, default='', verbose_name="视图名")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        verbose_name = "请求路由"
+        verbose_name_plural = "请求路由"
+        ordering = ['route']
+        unique_together = [['route', 'view_name']]
+
+    def __str__(self):
+        return self.route
+
+
 class RequestLog(models.Model):
     """请求日志模型（用于记录请求耗时）"""
     path = models.CharField(max_length=500, verbose_name="请求路径")
+    route = models.ForeignKey(
+        RequestRoute, on_delete=models.PROTECT, null=True, blank=True,
+        related_name='request_logs', verbose_name="路由"
+    )
     method = models.CharField(max_length=10, verbose_name="请求方法")
     status_code = models.IntegerField(verbose_name="状态码")
     duration_ms = models.FloatField(verbose_name="耗时(毫秒)")
     ip_address = models.GenericIPAddressField(blank=True, null=True, verbose_name="客户端IP")
     user_agent = models.CharField(max_length=500, blank=True, null=True, verbose_name="User Agent")
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    # 采样写入时这一条代表的请求数（1/采样率），按权重求和得到无偏的请求数和分位数
+    sample_weight = models.FloatField(default=1.0, verbose_name="采样权重")
+    # 请求期间在默认数据库连接上执行的SQL（见 query_stats）
+    query_count = models.IntegerField(default=0, verbose_name="查询次数")
+    sql_duration_ms = models.FloatField(default=0, verbose_name="SQL耗时(毫秒)")
+    slowest_query_ms = models.FloatField(blank=True, null=True, verbose_name="最慢查询耗时(毫秒)")
+    slowest_query = models.CharField(max_length=1000, blank=True, default='', verbose_name="最慢查询指纹")
+    # 由请求线程赋值为请求结束的时间，后台批量写入时保留
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="创建时间")
 
     class Meta:
         verbose_name = "请求日志"
@@ -174,8 +546,39 @@ class RequestLog(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['-created_at']),
-            models.Index(fields=['path', 'method']),
+            models.Index(fields=['route', 'method']),
         ]
 
     def __str__(self):
         return f"{self.method} {self.path} - {self.duration_ms}ms ({self.created_at})"
+
+
+class RequestLatencyRollup(models.Model):
+    """
+    请求耗时分钟汇总模型
+
+    每个进程每分钟按（路由, 方法, 状态码类别）写入一行直方图，查询时合并多行计算分位数
+    """
+    minute = models.DateTimeField(verbose_name="分钟")
+    route = models.ForeignKey(
+        RequestRoute, on_delete=models.PROTECT, related_name='latency_rollups', verbose_name="路由"
+    )
+    method = models.CharField(max_length=10, verbose_name="请求方法")
+    status_class = models.PositiveSmallIntegerField(verbose_name="状态码类别")  # 2表示2xx，以此类推
+    count = models.IntegerField(verbose_name="请求次数")
+    duration_sum_ms = models.FloatField(verbose_name="耗时合计(毫秒)")
+    duration_max_ms = models.FloatField(verbose_name="最大耗时(毫秒)")
+    # 各对数刻度桶的请求次数，桶边界见 request_metrics.BUCKET_BOUNDS_MS
+    buckets = models.JSONField(verbose_name="耗时分布")
+
+    class Meta:
+        verbose_name = "请求耗时汇总"
+        verbose_name_plural = "请求耗时汇总"
+        ordering = ['-minute']
+        indexes = [
+            models.Index(fields=['minute']),
+            models.Index(fields=['route', 'method', 'minute']),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.route} {self.status_class}xx - {self.count}次 ({self.minute})"
@@ -0,0 +1,111 @@
+"""
+批量密码生成模块
+
+一次从 secrets.token_bytes 取一大块随机字节，用 bytes.translate 在C层完成映射：
+字节值小于 256 - 256 % 字符集大小 的映射到字符集（字节值对字符集大小取模），
+其余字节直接丢弃（拒绝采样），保证每个字符等概率出现，没有取模偏差。
+不满足字符类别要求的密码整条丢弃重新生成。
+"""
+import re
+import secrets
+import string
+
+CHARACTER_CLASSES = {
+    'lower': string.ascii_lowercase,
+    'upper': string.ascii_uppercase,
+    'digit': string.digits,
+    'symbol': '!@#$%^&*',
+}
+# 容易混淆的字符
+AMBIGUOUS_CHARACTERS = 'Il1O0o'
+
+
+class PasswordGenerator:
+    """
+    按密码策略批量生成密码
+
+    Args:
+        length: 密码长度
+        classes: 使用的字符类别（CHARACTER_CLASSES 的键）
+        require_classes: 每个密码必须包含的字符类别
+        exclude_ambiguous: 是否排除容易混淆的字符（AMBIGUOUS_CHARACTERS）
+    """
+
+    def __init__(self, length=16, classes=('lower', 'upper', 'digit', 'symbol'),
+                 require_classes=(), exclude_ambiguous=False):
+        unknown = set(classes) | set(require_classes)
+        unknown -= set(CHARACTER_CLASSES)
+        if unknown:
+            raise ValueError(f"未知的字符类别: {', '.join(sorted(unknown))}")
+        if not set(require_classes) <= set(classes):
+            raise ValueError("必须包含的字符类别不在使用的字符类别中")
+        if length < 1:
+            raise ValueError("密码长度必须大于0")
+        if length < len(require_classes):
+            raise ValueError("密码长度小于必须包含的字符类别数")
+
+        excluded = AMBIGUOUS_CHARACTERS if exclude_ambiguous else ''
+        self.length = length
+        self.alphabet = ''.join(
+            char for name in classes for char in CHARACTER_CLASSES[name] if char not in excluded
+        )
+        if not 1 < len(self.alphabet) <= 256:
+            raise ValueError("字符集大小必须在2到256之间")
+        # 每个必须包含的字符类别一个前瞻断言，一次匹配完成检查
+        self._required_pattern = None
+        if require_classes:
+            self._required_pattern = re.compile(''.join(
+                '(?=.*[' + re.escape(''.join(c for c in CHARACTER_CLASSES[name] if c not in excluded)) + '])'
+                for name in require_classes
+            ))
+
+        # 字节值 -> 字符的映射表，超出可均匀映射范围的字节被删除
+        size = len(self.alphabet)
+        limit = 256 - 256 % size
+        self._table = bytes(ord(self.alphabet[value % size]) if value < limit else 0 for value in range(256))
+        self._rejected = bytes(range(limit, 256))
+        self._accept_ratio = limit / 256
+        # 满足字符类别要求的概率未知，按经验多取一些，不够时再补
+        self._oversample = 1.25 if self._required_pattern else 1.0
+
+    @classmethod
+    def from_policy(cls, policy):
+        """
+        根据策略字典创建生成器（如 settings.PASSWORD_POLICY）
+
+        Args:
+            policy: {'length', 'classes', 'require_classes', 'exclude_ambiguous'}，均可省略
+        """
+        return cls(**policy)
+
+    def _random_chars(self, count):
+        """生成 count 个均匀分布的字符"""
+        chars = b''
+        while len(chars) < count:
+            # 按接受率多取一些字节，少量不足时再补一轮
+            needed = count - len(chars)
+            buffer = secrets.token_bytes(int(needed / self._accept_ratio) + 16)
+            chars += buffer.translate(self._table, self._rejected)
+        return chars[:count].decode('ascii')
+
+    def generate(self, count):
+        """
+        批量生成密码
+
+        Args:
+            count: 密码数量
+
+        Returns:
+            list: 密码列表
+        """
+        length = self.length
+        pattern = self._required_pattern
+        passwords = []
+        while len(passwords) < count:
+            batch = int((count - len(passwords)) * self._oversample) + 1
+            chars = self._random_chars(batch * length)
+            for start in range(0, batch * length, length):
+                password = chars[start:start + length]
+                if pattern is None or pattern.match(password):
+                    passwords.append(password)
+        return passwords[:count]
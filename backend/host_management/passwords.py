@@ -0,0 +1,596 @@
+"""
+主机密码轮换模块
+
+按主键顺序流式读取主机，每批在一个事务中完成：
+用 bulk_create 补建缺失的 HostPassword 记录，已有记录用一条参数化 UPDATE 语句
+executemany 写入新的加密密码（bulk_update 生成的 CASE WHEN 语句在十万级主机时太慢，
+与 reachability.update_host_reachability 的做法一致）。
+整次轮换复用进程内缓存的密钥环（HostPassword.get_cipher）。
+全量轮换可按主键范围切分为多个分片，由多个 Celery worker 并行执行，
+每个分片的进度记录在 PasswordRotationRun 中，中断后从检查点续跑。
+定时轮换按每台主机的 password_changed_at 计算到期时间，每次只轮换限额内的到期主机，
+使数据库负载均匀分布在整个轮换周期内。
+更换加密密钥后，reencrypt_host_passwords 把用已退役密钥加密的密码重新加密为当前密钥，
+进度记录在 KeyRotationRun 中。
+批量获取密码明文时一次查询取出密文，大批量时用线程池分段解密，审计记录按批写入。
+"""
+import logging
+import time
+from datetime import timedelta
+import math
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from django.db.models import Count, Exists, Max, Min, OuterRef
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from cryptography.fernet import InvalidToken
+from .models import (
+    Host, HostPassword, HostPasswordHistory, PasswordAccessLog, PasswordRotationRun, KeyRotationRun
+)
+from .password_generator import PasswordGenerator
+
+logger = logging.getLogger(__name__)
+
+
+def _iter_chunks(iterable, size):
+    """把可迭代对象按 size 切分成列表"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _update_sql():
+    """按主机ID更新加密密码和修改时间的参数化 UPDATE 语句"""
+    meta = HostPassword._meta
+    quote_name = connection.ops.quote_name
+    return (
+        'UPDATE {table} SET {encrypted_password} = %s, {password_changed_at} = %s '
+        'WHERE {host} = %s'
+    ).format(
+        table=quote_name(meta.db_table),
+        encrypted_password=quote_name(meta.get_field('encrypted_password').column),
+        password_changed_at=quote_name(meta.get_field('password_changed_at').column),
+        host=quote_name(meta.get_field('host').column),
+    )
+
+
+def get_password_generator(policy=None):
+    """
+    按密码策略创建批量密码生成器
+
+    Args:
+        policy: 密码策略字典，默认 settings.PASSWORD_POLICY
+    """
+    return PasswordGenerator.from_policy(settings.PASSWORD_POLICY if policy is None else policy)
+
+
+def rotate_password_chunk(host_ids, cipher, generator):
+    """
+    为一批主机生成并写入新密码，同时追加密码历史（在一个事务中完成）
+
+    Args:
+        host_ids: 主机ID列表
+        cipher: 密钥环（HostPassword.get_cipher()）
+        generator: PasswordGenerator
+
+    Returns:
+        tuple: (新建的密码记录数, 更新的密码记录数)
+    """
+    changed_at = timezone.now()
+    encrypted = {
+        host_id: cipher.encrypt(password.encode()).decode()
+        for host_id, password in zip(host_ids, generator.generate(len(host_ids)))
+    }
+    with transaction.atomic():
+        existing_host_ids = set(
+            HostPassword.objects.filter(host_id__in=host_ids)
+            .values_list('host_id', flat=True)
+        )
+
+        # 不经过 save()，auto_now 不生效，这里显式写入修改时间
+        password_changed_at = connection.ops.adapt_datetimefield_value(changed_at)
+        params = [
+            (encrypted[host_id], password_changed_at, host_id)
+            for host_id in host_ids
+            if host_id in existing_host_ids
+        ]
+        if params:
+            with connection.cursor() as cursor:
+                cursor.executemany(_update_sql(), params)
+
+        HostPassword.objects.bulk_create([
+            HostPassword(host_id=host_id, encrypted_password=encrypted[host_id])
+            for host_id in host_ids
+            if host_id not in existing_host_ids
+        ], batch_size=1000)
+
+        HostPasswordHistory.objects.bulk_create([
+            HostPasswordHistory(host_id=host_id, encrypted_password=token, changed_at=changed_at)
+            for host_id, token in encrypted.items()
+        ], batch_size=1000)
+
+    created = len(host_ids) - len(existing_host_ids)
+    return created, len(existing_host_ids)
+
+
+def plan_rotation_shards(shard_size=20000):
+    """
+    按主键范围把所有主机切分为若干分片
+
+    只查询一次主键的最小值、最大值和主机总数，按主键跨度均分；
+    主键不连续时各分片的主机数会有偏差。
+
+    Args:
+        shard_size: 每个分片的目标主机数
+
+    Returns:
+        list: [(start_id, end_id), ...]，闭区间，按主键升序
+    """
+    bounds = Host.objects.aggregate(min_id=Min('id'), max_id=Max('id'), count=Count('id'))
+    if not bounds['count']:
+        return []
+    shards = math.ceil(bounds['count'] / shard_size)
+    step = math.ceil((bounds['max_id'] - bounds['min_id'] + 1) / shards)
+    return [
+        (start_id, min(start_id + step - 1, bounds['max_id']))
+        for start_id in range(bounds['min_id'], bounds['max_id'] + 1, step)
+    ]
+
+
+def _checkpoint(run, last_host_id, created=0, updated=0, failed=0, error=None):
+    """写入轮换记录的检查点（成功批次与该批的密码写入在同一事务中提交）"""
+    run.last_host_id = last_host_id
+    run.created_count += created
+    run.updated_count += updated
+    run.failed_count += failed
+    update_fields = ['last_host_id', 'created_count', 'updated_count', 'failed_count', 'updated_at']
+    if error is not None:
+        run.errors = (run.errors + [error])[-PasswordRotationRun.MAX_ERRORS:]
+        update_fields.append('errors')
+    run.save(update_fields=update_fields)
+
+
+def rotate_host_passwords(chunk_size=1000, id_range=None, run=None, generator=None):
+    """
+    轮换所有主机（或指定主键范围内主机）的密码
+
+    单批失败时该批事务回滚、记录错误后继续下一批，已提交的批次不受影响。
+    指定 run 时轮换该记录的主键范围，从检查点 last_host_id 之后继续，
+    每批结束后更新检查点；中途退出时下次从检查点续跑，已轮换的主机不会重复轮换。
+
+    Args:
+        chunk_size: 每批轮换的主机数
+        id_range: (start_id, end_id) 闭区间，为None时轮换所有主机
+        run: PasswordRotationRun，指定时忽略 id_range
+        generator: PasswordGenerator，默认按 settings.PASSWORD_POLICY 创建
+
+    Returns:
+        dict: 本次调用的 {'total': int, 'created': int, 'updated': int, 'failed': int, 'duration_ms': float}
+    """
+    cipher = HostPassword.get_cipher()
+    generator = generator or get_password_generator()
+    start_time = time.monotonic()
+    created = 0
+    updated = 0
+    failed = 0
+
+    queryset = Host.objects.all()
+    if run is not None:
+        queryset = queryset.filter(id__range=(run.start_id, run.end_id))
+        if run.last_host_id is not None:
+            queryset = queryset.filter(id__gt=run.last_host_id)
+    elif id_range is not None:
+        queryset = queryset.filter(id__range=id_range)
+    host_ids = (
+        queryset.order_by('id')
+        .values_list('id', flat=True)
+        .iterator(chunk_size=chunk_size)
+    )
+    for index, chunk in enumerate(_iter_chunks(host_ids, chunk_size), start=1):
+        chunk_start = time.monotonic()
+        try:
+            with transaction.atomic():
+                chunk_created, chunk_updated = rotate_password_chunk(chunk, cipher, generator)
+                if run is not None:
+                    _checkpoint(run, chunk[-1], created=chunk_created, updated=chunk_updated)
+        except Exception as e:
+            failed += len(chunk)
+            logger.error(
+                f"第 {index} 批密码轮换失败（主机ID {chunk[0]}-{chunk[-1]}）: {str(e)}"
+            )
+            if run is not None:
+                # 失败批次同样推进检查点，续跑时不再重复
+                run.refresh_from_db()
+                _checkpoint(run, chunk[-1], failed=len(chunk), error={
+                    'start_id': chunk[0],
+                    'end_id': chunk[-1],
+                    'error': str(e),
+                    'at': timezone.now().isoformat(),
+                })
+            continue
+        created += chunk_created
+        updated += chunk_updated
+        elapsed = max(time.monotonic() - chunk_start, 1e-6)
+        logger.info(
+            f"第 {index} 批密码轮换完成: {len(chunk)} 台主机"
+            f"（新建 {chunk_created}，更新 {chunk_updated}），"
+            f"耗时 {elapsed * 1000:.0f}ms，{len(chunk) / elapsed:.0f} 台/秒"
+        )
+
+    duration = (time.monotonic() - start_time) * 1000
+    return {
+        'total': created + updated,
+        'created': created,
+        'updated': updated,
+        'failed': failed,
+        'duration_ms': round(duration, 2),
+    }
+
+
+def start_rotation_runs(shard_size=20000):
+    """
+    按主键范围切分主机，为每个分片创建一条轮换记录
+
+    Returns:
+        list: [PasswordRotationRun, ...]
+    """
+    return [
+        PasswordRotationRun.objects.create(
+            start_id=start_id,
+            end_id=end_id,
+            host_count=Host.objects.filter(id__range=(start_id, end_id)).count()
+        )
+        for start_id, end_id in plan_rotation_shards(shard_size)
+    ]
+
+
+def get_stale_rotation_runs(stale_after):
+    """
+    获取中断的轮换记录：仍为运行中，但超过 stale_after 秒没有更新检查点
+
+    worker崩溃、任务被撤销或抢占时，记录会停留在运行中状态。
+
+    Args:
+        stale_after: 检查点超时时间（秒）
+
+    Returns:
+        QuerySet: PasswordRotationRun
+    """
+    return PasswordRotationRun.objects.filter(
+        status='running',
+        updated_at__lt=timezone.now() - timedelta(seconds=stale_after)
+    ).order_by('start_id')
+
+
+def finish_rotation_run(run, status='completed', error=None):
+    """把轮换记录标记为结束"""
+    run.status = status
+    run.finished_at = timezone.now()
+    update_fields = ['status', 'finished_at', 'updated_at']
+    if error is not None:
+        run.errors = (run.errors + [error])[-PasswordRotationRun.MAX_ERRORS:]
+        update_fields.append('errors')
+    run.save(update_fields=update_fields)
+
+
+def get_due_rotation_limit(interval, tick_interval):
+    """
+    按主机总数计算每次定时轮换的限额，使所有主机在一个轮换周期内均匀轮换一遍
+
+    Args:
+        interval: 轮换周期（秒）
+        tick_interval: 定时轮换的执行间隔（秒）
+
+    Returns:
+        int: 每次最多轮换的主机数
+    """
+    return math.ceil(Host.objects.count() * tick_interval / interval)
+
+
+def get_due_host_ids(interval, limit, now=None):
+    """
+    获取到期需要轮换密码的主机ID
+
+    没有密码记录的主机优先，其余主机按 password_changed_at 从早到晚，
+    password_changed_at 早于 now - interval 即为到期。
+
+    Args:
+        interval: 轮换周期（秒）
+        limit: 最多返回的主机数
+        now: 当前时间，默认 timezone.now()
+
+    Returns:
+        list: 主机ID列表
+    """
+    if limit <= 0:
+        return []
+    now = now or timezone.now()
+    host_ids = list(
+        Host.objects.filter(password_record__isnull=True)
+        .order_by('id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if len(host_ids) < limit:
+        host_ids += HostPassword.objects.filter(
+            password_changed_at__lte=now - timedelta(seconds=interval)
+        ).order_by('password_changed_at').values_list('host_id', flat=True)[:limit - len(host_ids)]
+    return host_ids
+
+
+def rotate_due_host_passwords(interval, limit, chunk_size=1000, generator=None):
+    """
+    轮换到期主机的密码，最多 limit 台
+
+    Args:
+        interval: 轮换周期（秒）
+        limit: 本次最多轮换的主机数
+        chunk_size: 每批轮换的主机数
+        generator: PasswordGenerator，默认按 settings.PASSWORD_POLICY 创建
+
+    Returns:
+        dict: {'total': int, 'created': int, 'updated': int, 'failed': int, 'duration_ms': float}
+    """
+    cipher = HostPassword.get_cipher()
+    generator = generator or get_password_generator()
+    start_time = time.monotonic()
+    created = 0
+    updated = 0
+    failed = 0
+
+    for chunk in _iter_chunks(get_due_host_ids(interval, limit), chunk_size):
+        try:
+            chunk_created, chunk_updated = rotate_password_chunk(chunk, cipher, generator)
+        except Exception as e:
+            failed += len(chunk)
+            logger.error(f"到期主机密码轮换失败（{len(chunk)} 台）: {str(e)}")
+            continue
+        created += chunk_created
+        updated += chunk_updated
+
+    duration = (time.monotonic() - start_time) * 1000
+    return {
+        'total': created + updated,
+        'created': created,
+        'updated': updated,
+        'failed': failed,
+        'duration_ms': round(duration, 2),
+    }
+
+
+def _reencrypt_sql(model):
+    """
+    按主键更新加密密码的参数化 UPDATE 语句（不修改修改时间）
+
+    只在密文仍为读取时的值时更新，避免覆盖并发轮换刚写入的新密码
+    """
+    meta = model._meta
+    quote_name = connection.ops.quote_name
+    return 'UPDATE {table} SET {encrypted_password} = %s WHERE {pk} = %s AND {encrypted_password} = %s'.format(
+        table=quote_name(meta.db_table),
+        encrypted_password=quote_name(meta.get_field('encrypted_password').column),
+        pk=quote_name(meta.pk.column),
+    )
+
+
+def _reencrypt_table(run, model, cursor_field, cipher, current, chunk_size):
+    """按主键顺序分批重新加密一张表的 encrypted_password，检查点为 run 的 cursor_field"""
+    sql = _reencrypt_sql(model)
+    while True:
+        chunk_start = time.monotonic()
+        queryset = model.objects.order_by('id')
+        last_id = getattr(run, cursor_field)
+        if last_id is not None:
+            queryset = queryset.filter(id__gt=last_id)
+        rows = list(queryset.values_list('id', 'encrypted_password')[:chunk_size])
+        if not rows:
+            return
+
+        params = []
+        errors = []
+        skipped = 0
+        for row_id, token in rows:
+            token = token.encode()
+            try:
+                current.decrypt(token)
+                skipped += 1
+                continue
+            except InvalidToken:
+                pass
+            try:
+                params.append((cipher.rotate(token).decode(), row_id, token.decode()))
+            except InvalidToken:
+                # 所有密钥都无法解密，保留原值
+                errors.append({
+                    'table': model._meta.db_table,
+                    'id': row_id,
+                    'error': '无法用密钥环中的任何密钥解密',
+                })
+
+        with transaction.atomic():
+            if params:
+                with connection.cursor() as cursor:
+                    cursor.executemany(sql, params)
+            setattr(run, cursor_field, rows[-1][0])
+            run.reencrypted_count += len(params)
+            run.skipped_count += skipped
+            run.failed_count += len(errors)
+            update_fields = [
+                cursor_field, 'reencrypted_count', 'skipped_count', 'failed_count', 'updated_at'
+            ]
+            if errors:
+                run.errors = (run.errors + errors)[-KeyRotationRun.MAX_ERRORS:]
+                update_fields.append('errors')
+            run.save(update_fields=update_fields)
+
+        elapsed = max(time.monotonic() - chunk_start, 1e-6)
+        logger.info(
+            f"密钥轮换进度 {run.progress:.1%}（{run.processed_count}/{run.total_count}）: "
+            f"{model._meta.verbose_name} 本批 {len(rows)} 条，"
+            f"重新加密 {len(params)}，跳过 {skipped}，失败 {len(errors)}，{len(rows) / elapsed:.0f} 条/秒"
+        )
+
+
+def reencrypt_host_passwords(run, chunk_size=1000):
+    """
+    把密码记录和密码历史重新加密为当前密钥，从轮换记录的检查点之后继续
+
+    先处理 HostPassword（检查点 last_password_id），再处理 HostPasswordHistory
+    （检查点 last_history_id）；按主键顺序分批读取，已用当前密钥加密的记录跳过，
+    其余用密钥环解密后以当前密钥重新加密，每批的写入与检查点在同一事务中提交。
+    重新加密不修改修改时间，不影响密码轮换的到期时间和按时间查询历史密码。
+
+    Args:
+        run: KeyRotationRun
+        chunk_size: 每批处理的记录数
+
+    Returns:
+        KeyRotationRun: 更新后的轮换记录
+    """
+    cipher = HostPassword.get_cipher()
+    current = HostPassword.get_current_cipher()
+    _reencrypt_table(run, HostPassword, 'last_password_id', cipher, current, chunk_size)
+    _reencrypt_table(run, HostPasswordHistory, 'last_history_id', cipher, current, chunk_size)
+
+    run.status = 'completed'
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'finished_at', 'updated_at'])
+    return run
+
+
+def _decrypt_tokens(cipher, tokens):
+    """解密一组密文，无法解密的返回None"""
+    passwords = []
+    for token in tokens:
+        try:
+            passwords.append(cipher.decrypt(token.encode()).decode())
+        except InvalidToken:
+            passwords.append(None)
+    return passwords
+
+
+def iter_decrypted_passwords(rows, chunk_size=500, max_workers=8, parallel_threshold=2000):
+    """
+    分批解密密码，按批产出结果
+
+    rows 超过 parallel_threshold 条时，每批切分为 max_workers 段交给线程池并行解密。
+
+    Args:
+        rows: [(host_id, hostname, ip_address, password_changed_at, encrypted_password), ...]
+        chunk_size: 每批条数
+        max_workers: 线程池大小
+        parallel_threshold: 使用线程池的最少条数
+
+    Yields:
+        list: [{'host_id', 'hostname', 'ip_address', 'password', 'password_changed_at'}, ...]
+    """
+    cipher = HostPassword.get_cipher()
+    executor = None
+    if len(rows) >= parallel_threshold and max_workers > 1:
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='decrypt')
+    try:
+        for chunk in _iter_chunks(rows, chunk_size):
+            tokens = [row[4] for row in chunk]
+            if executor is None:
+                passwords = _decrypt_tokens(cipher, tokens)
+            else:
+                step = math.ceil(len(tokens) / max_workers)
+                passwords = []
+                for part in executor.map(
+                    lambda start: _decrypt_tokens(cipher, tokens[start:start + step]),
+                    range(0, len(tokens), step)
+                ):
+                    passwords.extend(part)
+            yield [
+                {
+                    'host_id': host_id,
+                    'hostname': hostname,
+                    'ip_address': ip_address,
+                    'password': password,
+                    'password_changed_at': password_changed_at,
+                }
+                for (host_id, hostname, ip_address, password_changed_at, _), password in zip(chunk, passwords)
+            ]
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def record_password_access(user, ip_address, items):
+    """
+    批量写入密码获取审计记录
+
+    Args:
+        user: 获取密码的用户
+        ip_address: 客户端IP
+        items: iter_decrypted_passwords 产出的一批结果
+    """
+    accessed_at = timezone.now()
+    PasswordAccessLog.objects.bulk_create([
+        PasswordAccessLog(
+            user=user,
+            username=user.get_username(),
+            host_id=item['host_id'],
+            hostname=item['hostname'],
+            ip_address=ip_address,
+            accessed_at=accessed_at
+        )
+        for item in items
+    ], batch_size=1000)
+
+
+def get_password_as_of(host_id, at):
+    """
+    获取主机在某一时刻使用的密码
+
+    在 (host, -changed_at) 索引上取 changed_at <= at 的最新一条历史。
+
+    Args:
+        host_id: 主机ID
+        at: 时间
+
+    Returns:
+        str or None: 密码明文，没有该时刻之前的历史（或已过保留期）时返回None
+    """
+    token = (
+        HostPasswordHistory.objects.filter(host_id=host_id, changed_at__lte=at)
+        .order_by('-changed_at')
+        .values_list('encrypted_password', flat=True)
+        .first()
+    )
+    if token is None:
+        return None
+    return HostPassword.get_cipher().decrypt(token.encode()).decode()
+
+
+def purge_password_history(retention_days, chunk_size=5000):
+    """
+    按保留天数分批删除过期的密码历史，每批只删除 chunk_size 行，避免长时间锁表
+
+    每台主机最新的一条历史即使过期也保留，保证按时间查询到当前密码。
+
+    Returns:
+        int: 删除的记录数
+    """
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    deleted = 0
+    last_id = 0
+    while True:
+        rows = list(
+            HostPasswordHistory.objects.filter(changed_at__lt=cutoff, id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'host_id')[:chunk_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        ids = [row_id for row_id, host_id in rows]
+        # 同一主机更新的历史存在时才能删除
+        newer = HostPasswordHistory.objects.filter(
+            host_id=OuterRef('host_id'), changed_at__gt=OuterRef('changed_at')
+        )
+        deleted += HostPasswordHistory.objects.filter(id__in=ids).filter(Exists(newer)).delete()[0]
+    return deleted
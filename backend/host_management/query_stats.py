@@ -0,0 +1,63 @@
+"""
+请求SQL统计模块
+
+RequestTimingMiddleware 在每个请求期间通过 connection.execute_wrapper 安装 QueryStats，
+统计查询次数、SQL总耗时和最慢的一条语句，随请求日志写入并通过 Server-Timing 响应头返回。
+只统计默认数据库连接上、处理请求的线程内执行的查询。
+"""
+import re
+import time
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_PLACEHOLDER_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+
+
+def fingerprint_sql(sql):
+    """
+    把SQL归一化为指纹：参数和字面值替换为 ?，IN 列表等连续参数合并为 ...，空白折叠为一个空格
+
+    同一段代码生成的语句（参数个数不同也一样）得到相同的指纹，例如
+    'SELECT ... WHERE id IN (%s, %s, %s)' -> 'SELECT ... WHERE id IN (...)'
+    """
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    return _PLACEHOLDER_LIST.sub('...', sql)
+
+
+class QueryStats:
+    """
+    统计一个请求执行的SQL（作为 connection.execute_wrapper 的包装函数）
+
+    Attributes:
+        count: 查询次数（executemany 算一次）
+        duration: SQL总耗时（秒）
+        slowest_duration: 最慢一条语句的耗时（秒）
+        slowest_sql: 最慢一条语句的原始SQL（写入日志时再计算指纹）
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest_duration = 0.0
+        self.slowest_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if self.slowest_sql is None or elapsed > self.slowest_duration:
+                self.slowest_duration = elapsed
+                self.slowest_sql = sql
+
+    @property
+    def slowest_fingerprint(self):
+        return fingerprint_sql(self.slowest_sql) if self.slowest_sql is not None else ''
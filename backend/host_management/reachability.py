@@ -0,0 +1,316 @@
+"""
+主机可达性模块 - ping结果缓存与全量巡检
+
+探测结果按IP缓存在Django缓存层中（与 HostPassword.get_encryption_key 使用同一缓存），
+同一IP的并发请求只发起一次探测，其余请求等待该探测的结果。不可达（含超时、出错）的结果只缓存
+PING_CACHE_NEGATIVE_TTL 秒。多个worker共享结果和探测锁需要配置共享缓存（REDIS_CACHE_URL），
+默认的 LocMemCache 只在单个进程内生效（见 checks.check_shared_cache）。
+定时巡检对所有主机分批并发探测，结果批量追加到 HostProbe 表，
+并批量刷新 Host 上冗余的可达性字段（reachable、last_seen_at、last_rtt_ms）。
+"""
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Host, HostProbe
+from .utils import ping_host, iter_ping_hosts
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'host_management_ping'
+STATS_NAMES = ('hits', 'misses', 'coalesced')
+
+# 等待其他请求的探测结果时的轮询间隔（秒）
+_WAIT_INTERVAL = 0.05
+
+
+def _result_key(ip_address):
+    return f'{CACHE_PREFIX}:result:{ip_address}'
+
+
+def _lock_key(ip_address):
+    return f'{CACHE_PREFIX}:lock:{ip_address}'
+
+
+def _stats_key(name):
+    return f'{CACHE_PREFIX}:stats:{name}'
+
+
+def _incr_stat(name, delta=1):
+    """累加命中统计计数"""
+    if not delta:
+        return
+    key = _stats_key(name)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # 计数不存在时先创建；add 失败说明其他进程已创建
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def get_cache_stats():
+    """
+    获取ping缓存的命中统计
+
+    Returns:
+        dict: {'hits': int, 'misses': int, 'coalesced': int, 'hit_rate': float or None}
+    """
+    values = cache.get_many([_stats_key(name) for name in STATS_NAMES])
+    stats = {name: values.get(_stats_key(name), 0) for name in STATS_NAMES}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return stats
+
+
+def _cache_ttl(result):
+    """可达的结果缓存 PING_CACHE_TTL 秒，不可达（含超时、出错）的结果只缓存 PING_CACHE_NEGATIVE_TTL 秒"""
+    return settings.PING_CACHE_TTL if result['reachable'] else settings.PING_CACHE_NEGATIVE_TTL
+
+
+def _store(ip_address, result):
+    """写入缓存，附带探测完成时间"""
+    entry = dict(result, checked_at=time.time())
+    cache.set(_result_key(ip_address), entry, timeout=_cache_ttl(entry))
+    return entry
+
+
+def _store_many(entries):
+    """
+    批量写入缓存，按结果使用不同的缓存时间
+
+    Args:
+        entries: {ip_address: 结果dict（含checked_at）}
+    """
+    by_ttl = {}
+    for ip_address, entry in entries.items():
+        by_ttl.setdefault(_cache_ttl(entry), {})[_result_key(ip_address)] = entry
+    for ttl, values in by_ttl.items():
+        cache.set_many(values, timeout=ttl)
+
+
+def cached_ping_host(ip_address, timeout=3, fresh=False):
+    """
+    带缓存的ping探测
+
+    缓存未命中时通过 cache.add 抢占探测锁，抢到锁的请求负责探测并写缓存，
+    其余并发请求轮询等待该结果；持锁请求异常退出时，锁在超时后自动释放。
+
+    Args:
+        ip_address: IP地址
+        timeout: 超时时间（秒）
+        fresh: 为True时跳过缓存，只接受本次请求之后完成的探测结果
+
+    Returns:
+        tuple: (结果dict（含checked_at）, 是否来自缓存)
+    """
+    if not fresh:
+        entry = cache.get(_result_key(ip_address))
+        if entry is not None:
+            _incr_stat('hits')
+            return entry, True
+
+    _incr_stat('misses')
+    requested_at = time.time()
+    lock_timeout = timeout + 2
+    deadline = time.monotonic() + lock_timeout
+
+    while True:
+        if cache.add(_lock_key(ip_address), requested_at, timeout=lock_timeout):
+            try:
+                return _store(ip_address, ping_host(ip_address, timeout=timeout)), False
+            finally:
+                cache.delete(_lock_key(ip_address))
+
+        # 其他请求正在探测同一IP，等待其结果
+        time.sleep(_WAIT_INTERVAL)
+        entry = cache.get(_result_key(ip_address))
+        if entry is not None and (not fresh or entry['checked_at'] >= requested_at):
+            _incr_stat('coalesced')
+            return entry, False
+        if time.monotonic() >= deadline:
+            # 等待超时，自行探测
+            return _store(ip_address, ping_host(ip_address, timeout=timeout)), False
+
+
+def iter_cached_ping_hosts(ip_addresses, timeout=3, fresh=False, **kwargs):
+    """
+    带缓存的批量并发探测，先产出缓存命中的结果，再按完成顺序产出新探测的结果
+
+    批量探测不加单IP探测锁，新结果会写回缓存供后续请求使用。
+
+    Args:
+        ip_addresses: IP地址列表
+        timeout: 单次探测超时时间（秒）
+        fresh: 为True时跳过缓存
+        **kwargs: 透传给 iter_ping_hosts 的并发参数
+
+    Yields:
+        tuple: (ip_address, 结果dict, 是否来自缓存)
+    """
+    ip_addresses = list(dict.fromkeys(ip_addresses))
+    missing = ip_addresses
+    if not fresh and ip_addresses:
+        cached = cache.get_many([_result_key(ip_address) for ip_address in ip_addresses])
+        missing = []
+        for ip_address in ip_addresses:
+            entry = cached.get(_result_key(ip_address))
+            if entry is None:
+                missing.append(ip_address)
+            else:
+                yield ip_address, entry, True
+        _incr_stat('hits', len(ip_addresses) - len(missing))
+    _incr_stat('misses', len(missing))
+
+    pending = {}
+    for ip_address, result in iter_ping_hosts(missing, timeout=timeout, **kwargs):
+        entry = dict(result, checked_at=time.time())
+        pending[ip_address] = entry
+        if len(pending) >= 500:
+            _store_many(pending)
+            pending = {}
+        yield ip_address, entry, False
+    if pending:
+        _store_many(pending)
+
+
+def update_host_reachability(results, probed_at, chunk_size=1000):
+    """
+    按探测结果批量更新主机的可达性字段
+
+    不可达的主机每批用一条 UPDATE 标记 reachable=False；可达的主机每批用一条参数化
+    UPDATE 语句 executemany 写入 reachable、last_seen_at、last_rtt_ms
+    （bulk_update 生成的 CASE WHEN 语句在十万级主机时构造和执行都太慢）。
+    两种方式都不经过 save()，不会修改 updated_at。
+
+    Args:
+        results: [(host_id, ping结果dict), ...]
+        probed_at: 探测时间
+        chunk_size: 每批更新的主机数
+
+    Returns:
+        int: 更新的主机数
+    """
+    meta = Host._meta
+    quote_name = connection.ops.quote_name
+    sql = (
+        'UPDATE {table} SET {reachable} = %s, {last_seen_at} = %s, {last_rtt_ms} = %s '
+        'WHERE {pk} = %s'
+    ).format(
+        table=quote_name(meta.db_table),
+        reachable=quote_name(meta.get_field('reachable').column),
+        last_seen_at=quote_name(meta.get_field('last_seen_at').column),
+        last_rtt_ms=quote_name(meta.get_field('last_rtt_ms').column),
+        pk=quote_name(meta.pk.column),
+    )
+    last_seen_at = connection.ops.adapt_datetimefield_value(probed_at)
+
+    reachable_params = []
+    unreachable_ids = []
+    updated = 0
+
+    def flush():
+        nonlocal reachable_params, unreachable_ids, updated
+        with transaction.atomic():
+            if unreachable_ids:
+                updated += Host.objects.filter(id__in=unreachable_ids).update(reachable=False)
+            if reachable_params:
+                with connection.cursor() as cursor:
+                    cursor.executemany(sql, reachable_params)
+                updated += len(reachable_params)
+        reachable_params = []
+        unreachable_ids = []
+
+    for host_id, result in results:
+        if result['reachable']:
+            reachable_params.append((True, last_seen_at, result.get('response_time'), host_id))
+        else:
+            unreachable_ids.append(host_id)
+        if len(reachable_params) + len(unreachable_ids) >= chunk_size:
+            flush()
+    flush()
+    return updated
+
+
+def sweep_hosts(chunk_size=5000, timeout=1, max_in_flight=4096):
+    """
+    对所有主机做一次可达性巡检，结果批量写入 HostProbe、刷新主机可达性字段和ping缓存
+
+    按主键顺序分批读取主机，每批并发探测后用 bulk_create 一次写入。
+
+    Args:
+        chunk_size: 每批主机数
+        timeout: 单次探测超时时间（秒）
+        max_in_flight: 使用ICMP套接字时的最大在途探测数
+
+    Returns:
+        dict: {'total': int, 'reachable': int, 'duration_ms': float}
+    """
+    start_time = time.monotonic()
+    total = 0
+    reachable = 0
+    last_id = 0
+
+    while True:
+        hosts = list(
+            Host.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'ip_address')[:chunk_size]
+        )
+        if not hosts:
+            break
+        last_id = hosts[-1][0]
+
+        results = dict(iter_ping_hosts(
+            [ip_address for _, ip_address in hosts],
+            timeout=timeout,
+            max_workers=settings.PING_MAX_CONCURRENCY,
+            max_in_flight=max_in_flight
+        ))
+        probed_at = timezone.now()
+        checked_at = time.time()
+
+        probes = []
+        for host_id, ip_address in hosts:
+            result = results[ip_address]
+            probes.append(HostProbe(
+                host_id=host_id,
+                probed_at=probed_at,
+                rtt_ms=result.get('response_time'),
+                reachable=result['reachable']
+            ))
+            if result['reachable']:
+                reachable += 1
+        HostProbe.objects.bulk_create(probes, batch_size=1000)
+        update_host_reachability(
+            [(host_id, results[ip_address]) for host_id, ip_address in hosts],
+            probed_at
+        )
+        _store_many({ip_address: dict(result, checked_at=checked_at) for ip_address, result in results.items()})
+        total += len(hosts)
+
+    duration = (time.monotonic() - start_time) * 1000
+    return {'total': total, 'reachable': reachable, 'duration_ms': round(duration, 2)}
+
+
+def purge_host_probes(retention_days, chunk_size=5000):
+    """
+    按保留天数分批删除过期的探测记录，每批只删除 chunk_size 行，避免长时间锁表
+
+    Returns:
+        int: 删除的记录数
+    """
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        ids = list(
+            HostProbe.objects.filter(probed_at__lt=cutoff)
+            .values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        deleted += HostProbe.objects.filter(id__in=ids).delete()[0]
+    return deleted
@@ -0,0 +1,248 @@
+"""
+请求日志后台写入模块
+
+请求线程只把日志字段放入进程内的有界队列（不访问数据库），
+由后台线程攒批后用 bulk_create 写入：攒够 REQUEST_LOG_BATCH_SIZE 条或距上次写入超过
+REQUEST_LOG_FLUSH_INTERVAL_MS 毫秒时写入一次。队列满时丢弃并计数。
+路由模板和视图名在写入时转换为 RequestRoute 的主键（见 request_routes）。
+普通请求按 REQUEST_LOG_SAMPLE_RATE（或按路由设置的采样率）采样写入，慢请求和5xx总是写入，
+每条日志记录采样权重，按权重统计的请求数和分位数是无偏的。
+后台线程按进程懒启动（fork 出的子进程会重新启动自己的线程），
+进程退出时（atexit，以及 Celery worker 子进程退出信号）写入队列中剩余的日志。
+"""
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db import close_old_connections, connection
+from .models import RequestLog, RequestRoute
+from .request_routes import intern_routes
+from .request_metrics import PERCENTILES
+
+logger = logging.getLogger(__name__)
+
+# 通知后台线程立即写入并退出
+_STOP = object()
+
+
+def get_sample_weight(route, view_name, status_code, duration_ms):
+    """
+    决定一个请求是否写入请求日志
+
+    慢请求（不低于 REQUEST_LOG_SLOW_THRESHOLD_MS）和5xx总是写入，权重为1；
+    其他请求按路由模板、视图名或默认的采样率随机写入，权重为 1/采样率。
+
+    Returns:
+        float: 写入时的采样权重，不写入时返回 None
+    """
+    if status_code >= 500 or duration_ms >= settings.REQUEST_LOG_SLOW_THRESHOLD_MS:
+        return 1.0
+    rates = settings.REQUEST_LOG_ROUTE_SAMPLE_RATES
+    rate = rates.get(route, rates.get(view_name, settings.REQUEST_LOG_SAMPLE_RATE))
+    if rate >= 1:
+        return 1.0
+    if rate <= 0 or random.random() >= rate:
+        return None
+    return 1 / rate
+
+
+def build_request_logs(batch):
+    """把日志字段（route、view_name 为路由模板和视图名）转换为 RequestLog 实例"""
+    route_ids = intern_routes((fields['route'], fields['view_name']) for fields in batch if 'route' in fields)
+    logs = []
+    for fields in batch:
+        fields = dict(fields)
+        route = fields.pop('route', None)
+        view_name = fields.pop('view_name', '')
+        logs.append(RequestLog(route_id=route_ids.get((route, view_name)), **fields))
+    return logs
+
+
+class RequestLogWriter:
+    """
+    请求日志的批量写入器
+
+    Args:
+        batch_size: 每批最多写入的条数
+        flush_interval: 最长写入间隔（秒）
+        queue_size: 队列容量，超出后丢弃新日志
+    """
+
+    def __init__(self, batch_size, flush_interval, queue_size):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+    def submit(self, **fields):
+        """放入一条日志（字段同 build_request_logs），队列满时丢弃"""
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # fork 之后父进程的线程不存在，队列也可能处于不一致状态，重新创建
+            if self._pid is not None:
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._thread = threading.Thread(target=self._run, name='request-log-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                batch.append(item)
+            if stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._write(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+        connection.close()
+
+    def _write(self, batch):
+        # 后台线程有自己的数据库连接，写入前按 CONN_MAX_AGE 清理失效的连接
+        close_old_connections()
+        try:
+            RequestLog.objects.bulk_create(build_request_logs(batch))
+            self.written += len(batch)
+        except Exception:
+            # 写日志失败不应该影响请求，记录后丢弃这一批
+            self.failed += len(batch)
+            logger.exception(f"写入 {len(batch)} 条请求日志失败")
+
+    def shutdown(self, timeout=5):
+        """写入队列中剩余的日志并停止后台线程"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("请求日志队列已满，退出时无法通知后台线程")
+            return
+        thread.join(timeout)
+        if self.dropped:
+            logger.warning(f"请求日志队列溢出，共丢弃 {self.dropped} 条")
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_request_log_writer():
+    """返回进程内共享的写入器（首次调用时按配置创建）"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = RequestLogWriter(
+                    batch_size=settings.REQUEST_LOG_BATCH_SIZE,
+                    flush_interval=settings.REQUEST_LOG_FLUSH_INTERVAL_MS / 1000,
+                    queue_size=settings.REQUEST_LOG_QUEUE_SIZE
+                )
+                atexit.register(_writer.shutdown)
+    return _writer
+
+
+def save_request_log(**fields):
+    """
+    记录一条请求日志
+
+    REQUEST_LOG_ASYNC 为True时放入后台写入队列，否则直接写入数据库
+    """
+    if settings.REQUEST_LOG_ASYNC:
+        get_request_log_writer().submit(**fields)
+    else:
+        build_request_logs([fields])[0].save()
+
+
+def shutdown_request_log_writer(**kwargs):
+    """写入剩余日志（可直接连接到 Celery 的 worker_process_shutdown 等信号）"""
+    if _writer is not None:
+        _writer.shutdown()
+
+
+def summarize_request_logs(queryset):
+    """
+    按（路由, 方法, 状态码类别）统计采样写入的请求日志，按采样权重估算请求数、平均耗时和分位数
+
+    Args:
+        queryset: RequestLog 查询集（通常按时间范围过滤）
+
+    Returns:
+        list: 格式同 request_metrics.summarize_latency，另有 'sampled'（实际写入的日志条数）、
+              'avg_query_count'、'avg_sql_ms'（平均每个请求的查询次数和SQL耗时），按估算的请求数从多到少排列
+    """
+    groups = defaultdict(list)
+    rows = queryset.order_by().values_list(
+        'route_id', 'method', 'status_code', 'duration_ms', 'sample_weight', 'query_count', 'sql_duration_ms'
+    )
+    for route_id, method, status_code, duration_ms, sample_weight, query_count, sql_duration_ms in rows:
+        groups[(route_id, method, status_code // 100)].append(
+            (duration_ms, sample_weight, query_count, sql_duration_ms)
+        )
+
+    routes = RequestRoute.objects.in_bulk({route_id for route_id, _, _ in groups if route_id is not None})
+    results = []
+    for (route_id, method, status_class), samples in groups.items():
+        samples.sort()
+        total_weight = sum(sample[1] for sample in samples)
+        route = routes.get(route_id)
+        result = {
+            'route': route.route if route else None,
+            'view_name': route.view_name if route else None,
+            'method': method,
+            'status_class': f'{status_class}xx',
+            'count': round(total_weight),
+            'sampled': len(samples),
+            'avg_ms': round(sum(duration * weight for duration, weight, _, _ in samples) / total_weight, 2),
+            'max_ms': round(samples[-1][0], 2),
+            'avg_query_count': round(sum(count * weight for _, weight, count, _ in samples) / total_weight, 2),
+            'avg_sql_ms': round(sum(sql_ms * weight for _, weight, _, sql_ms in samples) / total_weight, 2),
+        }
+        # 加权分位数：累计权重首次达到 total_weight * p% 的耗时
+        targets = [(percentile, total_weight * percentile / 100) for percentile in PERCENTILES]
+        cumulative = 0.0
+        for duration, weight, _, _ in samples:
+            cumulative += weight
+            while targets and cumulative >= targets[0][1]:
+                result[f'p{targets.pop(0)[0]}_ms'] = round(duration, 2)
+        for percentile, _ in targets:
+            result[f'p{percentile}_ms'] = round(samples[-1][0], 2)
+        results.append(result)
+    results.sort(key=lambda item: item['count'], reverse=True)
+    return results
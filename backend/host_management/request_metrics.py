@@ -0,0 +1,248 @@
+"""
+请求耗时直方图模块
+
+RequestTimingMiddleware 把每个请求的耗时累加到进程内按（分钟, 路由模板, 方法, 状态码类别）划分的直方图中，
+直方图使用固定的对数刻度桶（相邻边界相差√2倍），累加只需一次二分查找。
+后台线程每 REQUEST_METRICS_FLUSH_INTERVAL 秒把已经结束的分钟写入 RequestLatencyRollup
+（每个键每分钟每个进程一行：次数、耗时合计、最大耗时、各桶次数），进程退出时写入全部。
+分位数（p50/p95/p99）由汇总行的桶次数合并计算，不需要扫描 RequestLog。
+"""
+import atexit
+import bisect
+import logging
+import os
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from .models import RequestLatencyRollup, RequestRoute
+from .request_routes import intern_routes
+
+logger = logging.getLogger(__name__)
+
+# 桶的上边界（毫秒）：0.5ms 到约 65s，相邻边界相差√2倍；最后一个桶收集超过上限的耗时
+BUCKET_BOUNDS_MS = tuple(0.5 * 2 ** (i / 2) for i in range(35))
+BUCKET_COUNT = len(BUCKET_BOUNDS_MS) + 1
+PERCENTILES = (50, 95, 99)
+
+
+def bucket_index(duration_ms):
+    """返回耗时所在桶的下标"""
+    return bisect.bisect_left(BUCKET_BOUNDS_MS, duration_ms)
+
+
+def estimate_percentile(buckets, count, max_ms, percentile):
+    """
+    根据各桶次数估算分位数（在所在桶内按线性分布插值，不超过最大耗时）
+
+    Args:
+        buckets: 各桶次数
+        count: 总次数
+        max_ms: 最大耗时
+        percentile: 分位（0-100）
+    """
+    if not count:
+        return None
+    rank = count * percentile / 100
+    cumulative = 0
+    for index, bucket_count in enumerate(buckets):
+        if bucket_count and cumulative + bucket_count >= rank:
+            if index >= len(BUCKET_BOUNDS_MS):
+                return max_ms
+            # 最大耗时所在的桶以最大耗时为上边界
+            upper = min(BUCKET_BOUNDS_MS[index], max_ms)
+            lower = min(BUCKET_BOUNDS_MS[index - 1] if index else 0.0, upper)
+            return lower + (upper - lower) * (rank - cumulative) / bucket_count
+        cumulative += bucket_count
+    return max_ms
+
+
+class LatencyHistograms:
+    """
+    进程内的请求耗时直方图
+
+    Args:
+        flush_interval: 后台线程写入已结束分钟的间隔（秒）
+    """
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def record(self, route, view_name, method, status_code, duration_ms):
+        """累加一次请求的耗时（route、view_name 见 request_routes.resolve_route）"""
+        if self._pid != os.getpid():
+            self._start()
+        minute = timezone.now().replace(second=0, microsecond=0)
+        key = (minute, (route, view_name), method, status_code // 100)
+        index = bucket_index(duration_ms)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0, 0.0, 0.0, [0] * BUCKET_COUNT]
+            histogram[0] += 1
+            histogram[1] += duration_ms
+            if duration_ms > histogram[2]:
+                histogram[2] = duration_ms
+            histogram[3][index] += 1
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # fork 之后父进程的线程不存在，子进程从空直方图开始
+            self._histograms = {}
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='request-metrics-flusher', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        connection.close()
+
+    def flush(self, include_current=False):
+        """
+        把直方图写入 RequestLatencyRollup
+
+        Args:
+            include_current: 是否连当前分钟一起写入（进程退出时）
+
+        Returns:
+            int: 写入的汇总行数
+        """
+        current_minute = timezone.now().replace(second=0, microsecond=0)
+        with self._lock:
+            if include_current:
+                flushed, self._histograms = self._histograms, {}
+            else:
+                flushed = {key: value for key, value in self._histograms.items() if key[0] < current_minute}
+                for key in flushed:
+                    del self._histograms[key]
+        if not flushed:
+            return 0
+
+        close_old_connections()
+        try:
+            route_ids = intern_routes(key[1] for key in flushed)
+            rollups = [
+                RequestLatencyRollup(
+                    minute=minute,
+                    route_id=route_ids[route],
+                    method=method,
+                    status_class=status_class,
+                    count=count,
+                    duration_sum_ms=duration_sum,
+                    duration_max_ms=duration_max,
+                    buckets=buckets
+                )
+                for (minute, route, method, status_class), (count, duration_sum, duration_max, buckets)
+                in flushed.items()
+            ]
+            RequestLatencyRollup.objects.bulk_create(rollups, batch_size=500)
+        except Exception:
+            # 写入失败不影响请求，记录后丢弃
+            logger.exception(f"写入 {len(flushed)} 条请求耗时汇总失败")
+            return 0
+        return len(rollups)
+
+    def shutdown(self):
+        """停止后台线程并写入全部直方图"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(self.flush_interval)
+        self.flush(include_current=True)
+
+
+_histograms = None
+_histograms_lock = threading.Lock()
+
+
+def get_latency_histograms():
+    """返回进程内共享的直方图（首次调用时按配置创建）"""
+    global _histograms
+    if _histograms is None:
+        with _histograms_lock:
+            if _histograms is None:
+                _histograms = LatencyHistograms(flush_interval=settings.REQUEST_METRICS_FLUSH_INTERVAL)
+                atexit.register(_histograms.shutdown)
+    return _histograms
+
+
+def shutdown_latency_histograms(**kwargs):
+    """写入全部直方图（可直接连接到 Celery 的 worker_process_shutdown 等信号）"""
+    if _histograms is not None:
+        _histograms.shutdown()
+
+
+def summarize_latency(queryset):
+    """
+    按（路由, 方法, 状态码类别）合并汇总行并计算分位数（按路由主键分组）
+
+    Args:
+        queryset: RequestLatencyRollup 查询集（通常按时间范围过滤）
+
+    Returns:
+        list: [{'route', 'view_name', 'method', 'status_class', 'count', 'avg_ms', 'max_ms', 'p50_ms', 'p95_ms', 'p99_ms'}]，
+              按次数从多到少排列
+    """
+    merged = {}
+    rows = queryset.order_by().values_list(
+        'route_id', 'method', 'status_class', 'count', 'duration_sum_ms', 'duration_max_ms', 'buckets'
+    )
+    for route_id, method, status_class, count, duration_sum, duration_max, buckets in rows:
+        entry = merged.get((route_id, method, status_class))
+        if entry is None:
+            entry = merged[(route_id, method, status_class)] = [0, 0.0, 0.0, [0] * BUCKET_COUNT]
+        entry[0] += count
+        entry[1] += duration_sum
+        entry[2] = max(entry[2], duration_max)
+        for index, bucket_count in enumerate(buckets):
+            entry[3][index] += bucket_count
+
+    routes = RequestRoute.objects.in_bulk({route_id for route_id, _, _ in merged})
+    results = []
+    for (route_id, method, status_class), (count, duration_sum, duration_max, buckets) in merged.items():
+        route = routes[route_id]
+        result = {
+            'route': route.route,
+            'view_name': route.view_name,
+            'method': method,
+            'status_class': f'{status_class}xx',
+            'count': count,
+            'avg_ms': round(duration_sum / count, 2) if count else None,
+            'max_ms': round(duration_max, 2),
+        }
+        for percentile in PERCENTILES:
+            value = estimate_percentile(buckets, count, duration_max, percentile)
+            result[f'p{percentile}_ms'] = round(value, 2) if value is not None else None
+        results.append(result)
+    results.sort(key=lambda item: item['count'], reverse=True)
+    return results
+
+
+def purge_latency_rollups(retention_days, chunk_size=5000):
+    """
+    按保留天数分批删除过期的耗时汇总，每批只删除 chunk_size 行，避免长时间锁表
+
+    Returns:
+        int: 删除的记录数
+    """
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        ids = list(
+            RequestLatencyRollup.objects.filter(minute__lt=cutoff)
+            .values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        deleted += RequestLatencyRollup.objects.filter(id__in=ids).delete()[0]
+    return deleted
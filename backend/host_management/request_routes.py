@@ -0,0 +1,103 @@
+"""
+请求路由模板模块
+
+请求日志和耗时汇总不按原始路径记录（/api/hosts/17/ping/ 和 /api/hosts/18/ping/ 是不同的路径），
+而是记录解析出的路由模板（api/hosts/<pk>/ping/）和视图名。
+（路由模板, 视图名）保存在 RequestRoute 表中，日志和汇总只引用其主键，按接口分组即为整数外键上的分组。
+路由数量由URL配置决定，进程内缓存全部主键，只在第一次出现时访问数据库。
+"""
+import functools
+import re
+import threading
+from .models import RequestRoute
+
+# 没有匹配到路由的请求（如404）归入同一个路由，避免按原始路径无限增长
+UNMATCHED_ROUTE = '<unmatched>'
+
+_GROUP_START = re.compile(r'\(\?P<(\w+)>')
+_CONVERTER = re.compile(r'<\w+:(\w+)>')
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_route(route):
+    """
+    把 resolver_match.route 转换为可读的路由模板
+
+    正则路由（DRF 路由器生成）的命名分组替换为 <name>，去掉 ^、$ 和可选的结尾斜杠，
+    路径转换器 <int:pk> 简写为 <pk>。例如 'api/hosts/(?P<pk>[^/.]+)/ping/$' -> 'api/hosts/<pk>/ping/'
+    """
+    parts = []
+    position = 0
+    while True:
+        match = _GROUP_START.search(route, position)
+        if match is None:
+            parts.append(route[position:])
+            break
+        parts.append(route[position:match.start()])
+        parts.append(f'<{match.group(1)}>')
+        # 跳过分组内的正则（按括号配对，忽略转义的括号）
+        depth = 1
+        index = match.end()
+        while index < len(route) and depth:
+            char = route[index]
+            if char == '\\':
+                index += 1
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+            index += 1
+        position = index
+    template = ''.join(parts).replace('^', '').replace('\\.', '.')
+    if template.endswith('$'):
+        template = template[:-1]
+    if template.endswith('/?'):
+        template = template[:-2]
+    return _CONVERTER.sub(r'<\1>', template)
+
+
+def resolve_route(request):
+    """
+    返回请求的（路由模板, 视图名）
+
+    没有匹配到路由时返回 (UNMATCHED_ROUTE, '')
+    """
+    resolver_match = getattr(request, 'resolver_match', None)
+    if resolver_match is None:
+        return UNMATCHED_ROUTE, ''
+    return normalize_route(resolver_match.route)[:500], (resolver_match.view_name or '')[:200]
+
+
+_route_ids = {}
+_route_ids_lock = threading.Lock()
+
+
+def intern_routes(keys):
+    """
+    返回（路由模板, 视图名）对应的 RequestRoute 主键，不存在的先创建
+
+    Args:
+        keys: 可迭代的 (route, view_name)
+
+    Returns:
+        dict: {(route, view_name): route_id}
+    """
+    keys = set(keys)
+    with _route_ids_lock:
+        result = {key: _route_ids[key] for key in keys if key in _route_ids}
+    missing = keys - result.keys()
+    if missing:
+        # 多个进程可能同时创建同一个路由，忽略冲突后重新查询主键
+        RequestRoute.objects.bulk_create(
+            [RequestRoute(route=route, view_name=view_name) for route, view_name in missing],
+            ignore_conflicts=True
+        )
+        routes = RequestRoute.objects.filter(route__in={route for route, _ in missing})
+        found = {
+            (route, view_name): route_id
+            for route_id, route, view_name in routes.values_list('id', 'route', 'view_name')
+        }
+        with _route_ids_lock:
+            _route_ids.update(found)
+        result.update((key, found[key]) for key in missing)
+    return result
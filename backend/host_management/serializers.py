@@ -2,7 +2,7 @@
 序列化器模块
 """
 from rest_framework import serializers
-from .models import City, DataCenter, Host, HostPassword, HostStatistics
+from .models import City, DataCenter, Host, HostCounter, HostPassword, HostStatistics
 
 
 class CitySerializer(serializers.ModelSerializer):
@@ -56,8 +56,8 @@ class HostSerializer(serializers.ModelSerializer):
         fields = ['id', 'hostname', 'ip_address', 'city', 'city_id', 'city_name',
                   'data_center', 'data_center_id', 'data_center_name', 'status',
                   'os_type', 'cpu_cores', 'memory_gb', 'disk_gb', 'description',
-                  'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
+                  'reachable', 'last_seen_at', 'last_rtt_ms', 'created_at', 'updated_at']
+        read_only_fields = ['reachable', 'last_seen_at', 'last_rtt_ms', 'created_at', 'updated_at']
 
     def validate_city_id(self, value):
         """验证城市ID是否存在"""
@@ -131,6 +131,17 @@ class HostStatisticsSerializer(serializers.ModelSerializer):
     class Meta:
         model = HostStatistics
         fields = ['id', 'city', 'city_name', 'data_center', 'data_center_name',
-                  'host_count', 'active_host_count', 'statistics_date', 'created_at']
+                  'host_count', 'active_host_count', 'cpu_cores', 'memory_gb', 'disk_gb',
+                  'status_counts', 'os_counts', 'statistics_date', 'created_at']
         read_only_fields = ['created_at']
 
+
+class HostCounterSerializer(serializers.ModelSerializer):
+    """主机实时计数序列化器"""
+    city_name = serializers.CharField(source='city.name', read_only=True)
+    data_center_name = serializers.CharField(source='data_center.name', read_only=True)
+
+    class Meta:
+        model = HostCounter
+        fields = ['city', 'city_name', 'data_center', 'data_center_name',
+                  'host_count', 'active_host_count', 'updated_at']
@@ -0,0 +1,504 @@
+"""
+主机统计模块
+
+按城市和机房维度统计主机数量和容量：对主机表按（城市, 机房, 状态, 操作系统）做一次分组聚合，
+同时得到主机数、运行中数量、CPU/内存/磁盘合计以及按状态和操作系统的分布，
+结果用一次批量 upsert 写入 HostStatistics（依赖 city、data_center、statistics_date 唯一约束）。
+没有主机的机房也写入一条数量为0的记录。
+
+写入每日统计后在同一事务中重新汇总当天所在的周和月（HostStatisticsRollup），
+时间范围查询按粒度读取最粗的可用汇总，返回列式序列。
+
+每个统计日期的版本号由该日期统计记录的条数和最后更新时间组成（statistics_date 索引上的一次聚合查询），
+统计接口据此生成 ETag 并按 ETag 缓存响应。版本号来自数据库，统计任务、回填命令在其他进程写入后
+所有 web 进程立即得到新的版本号，不依赖共享缓存。
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Sum, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import City, DataCenter, Host, HostStatistics, HostStatisticsRollup
+
+
+CACHE_PREFIX = 'host_management_statistics'
+
+
+def _response_key(etag):
+    return f'{CACHE_PREFIX}:response:{etag}'
+
+
+def get_statistics_version(statistics_date):
+    """
+    返回统计日期当前的版本号（统计记录条数和最后更新时间）
+
+    重新生成、回填统计都会更新 updated_at，删除机房会减少记录条数，版本号随之变化
+    """
+    result = HostStatistics.objects.filter(statistics_date=statistics_date).aggregate(
+        count=Count('id'), updated_at=Max('updated_at')
+    )
+    updated_at = result['updated_at'].isoformat() if result['updated_at'] else ''
+    return f"{result['count']}:{updated_at}"
+
+
+def get_cached_response(etag):
+    """读取按 ETag 缓存的响应数据，未命中返回None"""
+    return cache.get(_response_key(etag))
+
+
+def set_cached_response(etag, data, timeout):
+    cache.set(_response_key(etag), data, timeout=timeout)
+
+
+# os_type 为空的主机在操作系统分布中的键
+UNKNOWN_OS_TYPE = 'unknown'
+
+
+def _empty_statistics():
+    return {
+        'host_count': 0,
+        'active_host_count': 0,
+        'cpu_cores': 0,
+        'memory_gb': 0,
+        'disk_gb': 0,
+        'status_counts': {},
+        'os_counts': {},
+    }
+
+
+def _statistics_rows(queryset, *extra):
+    """
+    按（extra..., 城市, 机房, 状态, 操作系统）一次分组聚合主机数量和容量
+
+    每行为 (*extra, city_id, data_center_id, status, os_type, host_count, cpu_cores, memory_gb, disk_gb)
+    """
+    return (
+        queryset.order_by()
+        .values_list(*extra, 'city_id', 'data_center_id', 'status', 'os_type')
+        .annotate(
+            host_count=Count('id'),
+            cpu_cores_sum=Sum('cpu_cores'),
+            memory_gb_sum=Sum('memory_gb'),
+            disk_gb_sum=Sum('disk_gb')
+        )
+    )
+
+
+def _accumulate(statistics, city_id, data_center_id, status, os_type, host_count, cpu_cores, memory_gb, disk_gb):
+    """把一行分组结果累加到 statistics[(city_id, data_center_id)]"""
+    entry = statistics.get((city_id, data_center_id))
+    if entry is None:
+        entry = statistics[(city_id, data_center_id)] = _empty_statistics()
+    entry['host_count'] += host_count
+    if status == 'active':
+        entry['active_host_count'] += host_count
+    entry['cpu_cores'] += cpu_cores or 0
+    entry['memory_gb'] += memory_gb or 0
+    entry['disk_gb'] += disk_gb or 0
+    entry['status_counts'][status] = entry['status_counts'].get(status, 0) + host_count
+    os_type = os_type or UNKNOWN_OS_TYPE
+    entry['os_counts'][os_type] = entry['os_counts'].get(os_type, 0) + host_count
+
+
+def aggregate_host_statistics(queryset=None):
+    """
+    一次分组聚合统计每个（城市, 机房）的主机数量、容量合计以及按状态和操作系统的分布
+
+    Returns:
+        dict: {(city_id, data_center_id): {'host_count', 'active_host_count', 'cpu_cores', 'memory_gb',
+               'disk_gb', 'status_counts': {状态: 数量}, 'os_counts': {操作系统: 数量}}}
+    """
+    statistics = {}
+    for row in _statistics_rows(Host.objects.all() if queryset is None else queryset):
+        _accumulate(statistics, *row)
+    return statistics
+
+
+def _build_statistics(statistics_date, statistics, data_centers):
+    """
+    构造一天的统计记录
+
+    Args:
+        statistics: aggregate_host_statistics 的结果
+        data_centers: [(data_center_id, city_id)]，没有主机的机房生成数量为0的记录
+    """
+    empty = _empty_statistics()
+    records = []
+    for data_center_id, city_id in data_centers:
+        values = statistics.get((city_id, data_center_id), empty)
+        records.append(HostStatistics(
+            city_id=city_id,
+            data_center_id=data_center_id,
+            statistics_date=statistics_date,
+            host_count=values['host_count'],
+            active_host_count=values['active_host_count'],
+            cpu_cores=values['cpu_cores'],
+            memory_gb=values['memory_gb'],
+            disk_gb=values['disk_gb'],
+            # 回填时同一个字典会被逐天继续累加，这里复制一份
+            status_counts=dict(values['status_counts']),
+            os_counts=dict(values['os_counts'])
+        ))
+    return records
+
+
+def _upsert_statistics(statistics, batch_size):
+    """批量 upsert 统计记录（依赖 city、data_center、statistics_date 唯一约束）"""
+    HostStatistics.objects.bulk_create(
+        statistics,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['city', 'data_center', 'statistics_date'],
+        update_fields=[
+            'host_count', 'active_host_count', 'cpu_cores', 'memory_gb', 'disk_gb', 'status_counts', 'os_counts',
+            'updated_at'
+        ]
+    )
+
+
+def generate_statistics(statistics_date, batch_size=1000):
+    """
+    生成指定日期的主机统计并批量写入（已存在的记录被覆盖），同时更新所在周和月的汇总
+
+    与原实现一致，按机房所属城市统计：主机的城市与机房所属城市不一致时不计入。
+
+    Args:
+        statistics_date: 统计日期
+        batch_size: 每条 INSERT 语句写入的记录数
+
+    Returns:
+        int: 写入的统计记录数（即机房数）
+    """
+    statistics = _build_statistics(
+        statistics_date,
+        aggregate_host_statistics(),
+        DataCenter.objects.order_by().values_list('id', 'city_id')
+    )
+    with transaction.atomic():
+        _upsert_statistics(statistics, batch_size)
+        refresh_rollups([statistics_date])
+    return len(statistics)
+
+
+def backfill_statistics(date_from, date_to, batch_size=1000, refresh=True):
+    """
+    重新生成 [date_from, date_to] 每一天的主机统计（已存在的记录被覆盖）
+
+    主机没有历史记录，某一天的统计按当时已创建（created_at）的主机及其当前的城市、机房和状态计算，
+    已删除的主机不计入；机房同样只统计当时已创建的。
+    对主机表只做两次分组聚合（起始日之前的存量、范围内每天新增的主机），
+    再在内存中逐天累加，多天的记录合并批量 upsert（依赖 city、data_center、statistics_date 唯一约束，可重复执行）。
+
+    Args:
+        date_from: 开始日期
+        date_to: 结束日期
+        batch_size: 每条 INSERT 语句写入的记录数
+        refresh: 是否更新所涉及的周和月的汇总；并行回填时由调用方在全部结束后统一更新
+
+    Returns:
+        int: 写入的统计记录数
+    """
+    # 按当地时间的日期边界过滤（比 created_at__date 少一次逐行的日期转换）
+    range_start = timezone.make_aware(datetime.combine(date_from, datetime.min.time()))
+    range_end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    statistics = aggregate_host_statistics(Host.objects.filter(created_at__lt=range_start))
+    added = defaultdict(list)
+    for created_date, *row in _statistics_rows(
+        Host.objects.filter(created_at__gte=range_start, created_at__lt=range_end), TruncDate('created_at')
+    ):
+        added[created_date].append(row)
+    # 按创建时间排序，逐天把当天之前创建的机房加入 existing
+    data_centers = list(
+        DataCenter.objects.order_by('created_at')
+        .filter(created_at__lt=range_end)
+        .values_list('id', 'city_id', TruncDate('created_at'))
+    )
+    existing = []
+
+    written = 0
+    pending = []
+    dates = []
+    day = date_from
+    while day <= date_to:
+        for row in added.get(day, ()):
+            _accumulate(statistics, *row)
+        while len(existing) < len(data_centers) and data_centers[len(existing)][2] <= day:
+            data_center_id, city_id, _ = data_centers[len(existing)]
+            existing.append((data_center_id, city_id))
+        pending.extend(_build_statistics(day, statistics, existing))
+        dates.append(day)
+        day += timedelta(days=1)
+        # 攒够一定数量（或到最后一天）再写入，多天合并为一个事务
+        if len(pending) >= batch_size * 10 or day > date_to:
+            with transaction.atomic():
+                _upsert_statistics(pending, batch_size)
+            written += len(pending)
+            pending = []
+    if refresh:
+        with transaction.atomic():
+            refresh_rollups(dates)
+    return written
+
+
+# 时间序列的粒度，以及每种粒度读取的数据源（能组成该粒度的最粗的汇总表）
+SERIES_GRANULARITIES = ('day', 'week', 'month', 'quarter', 'year')
+SERIES_SOURCES = {
+    'day': 'day',
+    'week': 'week',
+    'month': 'month',
+    'quarter': 'month',
+    'year': 'month',
+}
+ROLLUP_GRANULARITIES = ('week', 'month')
+
+
+def period_start(day, granularity):
+    """返回日期所在周期的开始日期（周从周一开始）"""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    raise ValueError(f"未知的统计粒度: {granularity}")
+
+
+def next_period_start(start, granularity):
+    """返回下一个周期的开始日期（start 必须是周期开始日期）"""
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    months = {'month': 1, 'quarter': 3, 'year': 12}[granularity]
+    month = start.month - 1 + months
+    return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+
+
+def iter_periods(date_from, date_to, granularity):
+    """依次返回覆盖 [date_from, date_to] 的各周期开始日期"""
+    start = period_start(date_from, granularity)
+    while start <= date_to:
+        yield start
+        start = next_period_start(start, granularity)
+
+
+def refresh_rollups(dates):
+    """
+    重新汇总指定日期所在的周和月
+
+    每个周期对该周期内的每日统计做一次分组聚合，再批量 upsert，
+    所以重复写入同一天（覆盖每日统计）后汇总仍然正确。
+
+    Args:
+        dates: 写入了每日统计的日期
+
+    Returns:
+        int: 写入的汇总记录数
+    """
+    periods = {
+        (granularity, period_start(day, granularity))
+        for day in dates
+        for granularity in ROLLUP_GRANULARITIES
+    }
+    written = 0
+    for granularity, start in sorted(periods):
+        rows = (
+            HostStatistics.objects.order_by()
+            .filter(statistics_date__gte=start, statistics_date__lt=next_period_start(start, granularity))
+            .values_list('city_id', 'data_center_id')
+            .annotate(
+                day_count=Count('id'),
+                host_count_sum=Sum('host_count'),
+                active_host_count_sum=Sum('active_host_count')
+            )
+        )
+        rollups = [
+            HostStatisticsRollup(
+                granularity=granularity,
+                period_start=start,
+                city_id=city_id,
+                data_center_id=data_center_id,
+                day_count=day_count,
+                host_count_sum=host_count_sum,
+                active_host_count_sum=active_host_count_sum
+            )
+            for city_id, data_center_id, day_count, host_count_sum, active_host_count_sum in rows
+        ]
+        HostStatisticsRollup.objects.bulk_create(
+            rollups,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['granularity', 'city', 'data_center', 'period_start'],
+            update_fields=['day_count', 'host_count_sum', 'active_host_count_sum', 'updated_at']
+        )
+        written += len(rollups)
+    return written
+
+
+def choose_granularity(date_from, date_to, max_periods):
+    """选择周期数不超过 max_periods 的最细粒度"""
+    for granularity in SERIES_GRANULARITIES:
+        if sum(1 for _ in iter_periods(date_from, date_to, granularity)) <= max_periods:
+            return granularity
+    return SERIES_GRANULARITIES[-1]
+
+
+def get_statistics_series(date_from, date_to, granularity='auto', group_by='data_center',
+                          city_id=None, data_center_id=None):
+    """
+    按时间范围返回列式的主机数量序列
+
+    从能组成所需粒度的最粗的表读取（日粒度读每日统计，周读周汇总，月、季度、年读月汇总），
+    按城市或机房分组后在内存中合并到所需粒度。首尾周期按完整周期统计。
+    日粒度的值是当天的主机数量，其他粒度是周期内每天主机数量的平均值。
+
+    Args:
+        date_from: 开始日期
+        date_to: 结束日期
+        granularity: day/week/month/quarter/year，auto 时按 STATISTICS_RANGE_AUTO_PERIODS 选择
+        group_by: city 或 data_center
+        city_id: 只统计该城市
+        data_center_id: 只统计该机房
+
+    Returns:
+        dict: {'granularity', 'group_by', 'from', 'to', 'periods': [日期],
+               'series': [{'id', 'name', 'host_count': [...], 'active_host_count': [...]}]}
+        没有统计数据的周期值为 None
+    """
+    if date_from > date_to:
+        raise ValueError("开始日期不能晚于结束日期")
+    if group_by not in ('city', 'data_center'):
+        raise ValueError("group_by 必须是 city 或 data_center")
+    if granularity == 'auto':
+        granularity = choose_granularity(date_from, date_to, settings.STATISTICS_RANGE_AUTO_PERIODS)
+    if granularity not in SERIES_GRANULARITIES:
+        raise ValueError(f"granularity 必须是 auto 或 {'/'.join(SERIES_GRANULARITIES)}")
+    periods = list(iter_periods(date_from, date_to, granularity))
+    if len(periods) > settings.STATISTICS_RANGE_MAX_PERIODS:
+        raise ValueError(f"周期数超过 {settings.STATISTICS_RANGE_MAX_PERIODS}，请缩小范围或使用更粗的粒度")
+
+    source = SERIES_SOURCES[granularity]
+    start, end = periods[0], next_period_start(periods[-1], granularity)
+    if source == 'day':
+        queryset = HostStatistics.objects.filter(statistics_date__gte=start, statistics_date__lt=end)
+        period_field, aggregates = 'statistics_date', {
+            'host_count_sum': Sum('host_count'),
+            'active_host_count_sum': Sum('active_host_count'),
+            'day_count': Value(1),
+        }
+    else:
+        queryset = HostStatisticsRollup.objects.filter(
+            granularity=source, period_start__gte=start, period_start__lt=end
+        )
+        period_field, aggregates = 'period_start', {
+            'host_count_sum': Sum('host_count_sum'),
+            'active_host_count_sum': Sum('active_host_count_sum'),
+            # 按城市分组时各机房的统计天数相同，取最大值即该城市的统计天数
+            'day_count': Max('day_count'),
+        }
+    if city_id:
+        queryset = queryset.filter(city_id=city_id)
+    if data_center_id:
+        queryset = queryset.filter(data_center_id=data_center_id)
+    rows = queryset.order_by().values_list(period_field, f'{group_by}_id').annotate(**aggregates)
+
+    index = {start: i for i, start in enumerate(periods)}
+    sums = {}
+    for day, group_id, host_count_sum, active_host_count_sum, day_count in rows:
+        group = sums.setdefault(group_id, [[0] * len(periods) for _ in range(3)])
+        i = index[period_start(day, granularity)]
+        group[0][i] += host_count_sum
+        group[1][i] += active_host_count_sum
+        group[2][i] += day_count
+
+    model = City if group_by == 'city' else DataCenter
+    names = dict(model.objects.filter(id__in=sums).values_list('id', 'name'))
+
+    def averages(values, day_counts):
+        if granularity == 'day':
+            return [value if days else None for value, days in zip(values, day_counts)]
+        return [round(value / days, 2) if days else None for value, days in zip(values, day_counts)]
+
+    return {
+        'granularity': granularity,
+        'group_by': group_by,
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'periods': [start.isoformat() for start in periods],
+        'series': [
+            {
+                'id': group_id,
+                'name': names.get(group_id),
+                'host_count': averages(host_sums, day_counts),
+                'active_host_count': averages(active_sums, day_counts),
+            }
+            for group_id, (host_sums, active_sums, day_counts) in sorted(sums.items())
+        ],
+    }
+
+
+def get_capacity_report(statistics_date=None, group_by='data_center', city_id=None, data_center_id=None):
+    """
+    读取一天的容量统计，按城市或机房合并（只读取该日期的统计记录，不扫描主机表）
+
+    Args:
+        statistics_date: 统计日期，为None时使用最近一次统计的日期
+        group_by: city 或 data_center
+        city_id: 只统计该城市
+        data_center_id: 只统计该机房
+
+    Returns:
+        dict: {'statistics_date', 'group_by', 'totals': {...},
+               'results': [{'id', 'name', 'host_count', 'active_host_count', 'cpu_cores', 'memory_gb',
+                            'disk_gb', 'status_counts', 'os_counts'}]}
+        没有统计数据时 statistics_date 为 None
+    """
+    if group_by not in ('city', 'data_center'):
+        raise ValueError("group_by 必须是 city 或 data_center")
+    queryset = HostStatistics.objects.order_by()
+    if city_id:
+        queryset = queryset.filter(city_id=city_id)
+    if data_center_id:
+        queryset = queryset.filter(data_center_id=data_center_id)
+    if statistics_date is None:
+        statistics_date = queryset.aggregate(latest=Max('statistics_date'))['latest']
+
+    def merge(entry, row):
+        for field in ('host_count', 'active_host_count', 'cpu_cores', 'memory_gb', 'disk_gb'):
+            entry[field] += row[field]
+        for field in ('status_counts', 'os_counts'):
+            for key, count in row[field].items():
+                entry[field][key] = entry[field].get(key, 0) + count
+
+    totals = _empty_statistics()
+    groups = {}
+    rows = queryset.filter(statistics_date=statistics_date).values(
+        f'{group_by}_id', 'host_count', 'active_host_count', 'cpu_cores', 'memory_gb', 'disk_gb',
+        'status_counts', 'os_counts'
+    )
+    for row in rows:
+        group_id = row[f'{group_by}_id']
+        entry = groups.get(group_id)
+        if entry is None:
+            entry = groups[group_id] = _empty_statistics()
+        merge(entry, row)
+        merge(totals, row)
+
+    model = City if group_by == 'city' else DataCenter
+    names = dict(model.objects.filter(id__in=groups).values_list('id', 'name'))
+    return {
+        'statistics_date': statistics_date.isoformat() if statistics_date else None,
+        'group_by': group_by,
+        'totals': totals,
+        'results': [
+            {'id': group_id, 'name': names.get(group_id), **entry}
+            for group_id, entry in sorted(groups.items())
+        ],
+    }
@@ -1,16 +1,67 @@
 """
 工具函数模块
 """
+import logging
 import subprocess
 import platform
-import random
-import string
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from . import icmp
+from .password_generator import PasswordGenerator
+
+logger = logging.getLogger(__name__)
+
+
+def _use_icmp_socket():
+    """
+    根据 PING_BACKEND 配置判断是否使用进程内ICMP探测
+
+    'auto'：ICMP套接字可用时使用，否则回退到ping命令；'icmp'/'subprocess'：强制指定
+    """
+    backend = getattr(settings, 'PING_BACKEND', 'auto')
+    if backend == 'subprocess':
+        return False
+    if backend == 'icmp':
+        return True
+    return icmp.is_available()
 
 
 def ping_host(ip_address, timeout=3):
     """
     探测主机是否ping可达
     
+    优先使用进程内ICMP套接字，不允许创建套接字时回退到系统ping命令
+    
+    Args:
+        ip_address: IP地址
+        timeout: 超时时间（秒）
+    
+    Returns:
+        dict: {'reachable': bool, 'response_time': float or None}
+    """
+    if _use_icmp_socket():
+        try:
+            return icmp.IcmpProber(timeout=timeout).ping(ip_address)
+        except OSError as e:
+            return {
+                'reachable': False,
+                'response_time': None,
+                'error': str(e)
+            }
+    return ping_host_subprocess(ip_address, timeout=timeout)
+
+
+def ping_host_subprocess(ip_address, timeout=3):
+    """
+    通过系统ping命令探测主机是否ping可达
+    
     Args:
         ip_address: IP地址
         timeout: 超时时间（秒）
@@ -70,9 +121,172 @@ def ping_host(ip_address, timeout=3):
         }
 
 
+def iter_ping_hosts(ip_addresses, timeout=3, max_workers=64, max_in_flight=1024):
+    """
+    并发探测多台主机，按完成顺序逐个产出结果
+
+    并发数受 max_workers 限制，总耗时约等于最慢的一次探测，而不是所有探测耗时之和。
+
+    Args:
+        ip_addresses: IP地址列表（重复的IP只探测一次）
+        timeout: 单次探测超时时间（秒）
+        max_workers: 回退到ping命令时的最大并发进程数
+        max_in_flight: 使用ICMP套接字时的最大在途探测数
+
+    Yields:
+        tuple: (ip_address, ping_host的结果dict)
+    """
+    ip_addresses = list(dict.fromkeys(ip_addresses))
+    if not ip_addresses:
+        return
+
+    if _use_icmp_socket():
+        # 单个套接字复用所有探测
+        prober = icmp.IcmpProber(timeout=timeout, max_in_flight=max_in_flight)
+        yield from prober.iter_ping(ip_addresses)
+        return
+
+    workers = max(1, min(max_workers, len(ip_addresses)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ping') as executor:
+        futures = {
+            executor.submit(ping_host_subprocess, ip_address, timeout): ip_address
+            for ip_address in ip_addresses
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def ping_hosts(ip_addresses, timeout=3, max_workers=64, max_in_flight=1024):
+    """
+    并发探测多台主机
+
+    Args:
+        ip_addresses: IP地址列表
+        timeout: 单次探测超时时间（秒）
+        max_workers: 回退到ping命令时的最大并发进程数
+        max_in_flight: 使用ICMP套接字时的最大在途探测数
+
+    Returns:
+        dict: {ip_address: ping_host的结果dict}
+    """
+    return dict(iter_ping_hosts(
+        ip_addresses, timeout=timeout, max_workers=max_workers, max_in_flight=max_in_flight
+    ))
+
+
+class TaskLease:
+    """
+    task_lock 持有的租约
+
+    Attributes:
+        acquired: 是否获得锁
+        lost: 持有期间租约是否被其他进程接管（续期失败）
+    """
+
+    def __init__(self, name, timeout):
+        self.name = name
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+        self.acquired = False
+        self.lost = False
+
+    def _locks(self):
+        from .models import TaskLock
+        return TaskLock.objects.filter(name=self.name)
+
+    def acquire(self):
+        from .models import TaskLock
+        now = timezone.now()
+        TaskLock.objects.bulk_create([TaskLock(name=self.name, expires_at=now)], ignore_conflicts=True)
+        # 一条条件 UPDATE 完成抢占：只有空闲或租约已到期的锁能被接管
+        self.acquired = bool(
+            self._locks().filter(Q(token='') | Q(expires_at__lte=now)).update(
+                token=self.token, expires_at=now + timedelta(seconds=self.timeout), updated_at=now
+            )
+        )
+        return self.acquired
+
+    def renew(self):
+        """把租约延长 timeout 秒，返回是否仍持有锁"""
+        now = timezone.now()
+        renewed = self._locks().filter(token=self.token).update(
+            expires_at=now + timedelta(seconds=self.timeout), updated_at=now
+        )
+        if not renewed:
+            self.lost = True
+        return bool(renewed)
+
+    def release(self):
+        now = timezone.now()
+        self._locks().filter(token=self.token).update(token='', expires_at=now, updated_at=now)
+
+
+def _renew_lease(lease, stop):
+    # 后台线程使用独立的数据库连接，退出前关闭
+    try:
+        while not stop.wait(lease.timeout / 3):
+            try:
+                if not lease.renew():
+                    logger.error(f"任务锁 {lease.name} 的租约已被其他进程接管")
+                    return
+            except Exception:
+                logger.exception(f"任务锁 {lease.name} 续期失败")
+    finally:
+        connection.close()
+
+
+@contextmanager
+def task_lock(name, timeout):
+    """
+    基于数据库的跨进程互斥锁（非阻塞）
+
+    锁保存在 TaskLock 表中，所有进程和机器上的 worker 共用，不依赖缓存配置。
+    获得锁后由后台线程每 timeout/3 秒续期一次，任务执行多久都不会中途过期；
+    持有者进程异常退出后不再续期，租约最多 timeout 秒后到期，由下一次执行接管。
+
+    Args:
+        name: 锁名称
+        timeout: 租约时长（秒）
+
+    Yields:
+        TaskLease: acquired 表示是否获得锁
+    """
+    lease = TaskLease(name, timeout)
+    if not lease.acquire():
+        yield lease
+        return
+    stop = threading.Event()
+    renewer = threading.Thread(target=_renew_lease, args=(lease, stop), name=f'task-lock-{name}', daemon=True)
+    renewer.start()
+    try:
+        yield lease
+    finally:
+        stop.set()
+        renewer.join()
+        lease.release()
+
+
+def get_client_ip(request):
+    """
+    获取客户端IP（优先取 X-Forwarded-For 中的第一个地址）
+    
+    Args:
+        request: HttpRequest
+    
+    Returns:
+        str or None: 客户端IP
+    """
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
 def generate_random_password(length=16):
     """
-    生成随机密码
+    生成随机密码（密码学安全的随机数）
+    
+    需要批量生成时使用 password_generator.PasswordGenerator.generate
     
     Args:
         length: 密码长度
@@ -80,8 +294,8 @@ def generate_random_password(length=16):
     Returns:
         str: 随机密码
     """
+    if length < 1:
+        return ''
     # 包含大小写字母、数字和特殊字符
-    characters = string.ascii_letters + string.digits + "!@#$%^&*"
-    password = ''.join(random.choice(characters) for _ in range(length))
-    return password
+    return PasswordGenerator(length=length).generate(1)[0]
 